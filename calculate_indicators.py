@@ -1,4 +1,6 @@
+import io
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from datetime import date
 import argparse
@@ -6,8 +8,26 @@ import sys
 from psycopg2.extras import execute_values
 from store_stock_data import get_db_connection
 from get_price import get_all_dates_with_prices
+from relative_strength import RS_RATING_UPDATE_SQL
 from backend.utils.date_utils import get_calc_date
 
+def find_price_in_window(dates, target_date, window_start):
+    """
+    Locate the most recent price on or before target_date, but not before window_start.
+    
+    Args:
+        dates: Ascending numpy datetime64[D] array of one symbol's price dates
+        target_date: Latest acceptable date (datetime.date)
+        window_start: Earliest acceptable date (datetime.date)
+    
+    Returns:
+        Index into dates, or None if no price falls in the window
+    """
+    idx = np.searchsorted(dates, np.datetime64(target_date, 'D'), side='right') - 1
+    if idx < 0 or dates[idx] < np.datetime64(window_start, 'D'):
+        return None
+    return idx
+
 def calculate_indicators_batch(conn, symbols_batch, calc_date):
     """
     Calculate stock indicators for a batch of symbols.
@@ -47,30 +67,43 @@ def calculate_indicators_batch(conn, symbols_batch, calc_date):
         ORDER BY symbol, timestamp DESC
     """
     
-    # Use cursor directly for better array parameter handling and to avoid pandas warning
+    # Stream the rows out with COPY and parse them in C, instead of having psycopg2
+    # build a tuple (and a Decimal per price) for every one of the ~13 months of rows
     cursor = conn.cursor()
     try:
-        cursor.execute(query, (symbols_batch, start_timestamp, end_timestamp))
-        
-        # Fetch results and convert to DataFrame
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
-        df = pd.DataFrame(rows, columns=columns)
+        select_sql = cursor.mogrify(query, (symbols_batch, start_timestamp, end_timestamp)).decode()
+        buffer = io.StringIO()
+        cursor.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH CSV HEADER", buffer)
     finally:
         cursor.close()
     
+    buffer.seek(0)
+    # keep_default_na=False so tickers like NA or NULL stay strings; only the
+    # DECIMAL price columns may hold NaN (COPY writes it as "NaN")
+    df = pd.read_csv(
+        buffer,
+        dtype={'symbol': str, 'close': 'float64', 'high': 'float64', 'low': 'float64', 'volume': 'int64'},
+        keep_default_na=False,
+        na_values={'close': ['NaN'], 'high': ['NaN'], 'low': ['NaN']}
+    )
+    
     if df.empty:
         return pd.DataFrame()
     
+    df['price_date'] = pd.to_datetime(df['price_date']).dt.date
+    
     results = []
     
+    # Split the batch into per-symbol frames once (newest first) instead of
+    # scanning the whole batch frame for every symbol
+    df = df.sort_values(['symbol', 'price_date'], ascending=[True, False])
+    symbol_frames = dict(iter(df.groupby('symbol', sort=False)))
+    
     for symbol in symbols_batch:
-        symbol_data = df[df['symbol'] == symbol].copy()
-        if symbol_data.empty:
+        symbol_data = symbol_frames.get(symbol)
+        if symbol_data is None:
             continue
         
-        symbol_data = symbol_data.sort_values('price_date', ascending=False)
-        
         # Get current price (most recent on or before calc_date)
         current_mask = symbol_data['price_date'] <= calc_date
         if not current_mask.any():
@@ -128,45 +161,19 @@ def calculate_indicators_batch(conn, symbols_batch, calc_date):
             volumes = last_30_days['volume'].astype(float)
             avg_volume_30d = int(volumes.mean())
         
-        # Get price 3 months ago (within 7-day window)
-        target_3mo_date = target_3mo.date()
-        window_start_3mo = (target_3mo - pd.Timedelta(days=7)).date()
-        mask_3mo = (symbol_data['price_date'] <= target_3mo_date) & \
-                   (symbol_data['price_date'] >= window_start_3mo)
-        if not mask_3mo.any():
-            continue
-        price_3mo = float(symbol_data[mask_3mo].iloc[0]['close'])
-        date_3mo = symbol_data[mask_3mo].iloc[0]['price_date']
-        
-        # Get price 6 months ago
-        target_6mo_date = target_6mo.date()
-        window_start_6mo = (target_6mo - pd.Timedelta(days=7)).date()
-        mask_6mo = (symbol_data['price_date'] <= target_6mo_date) & \
-                   (symbol_data['price_date'] >= window_start_6mo)
-        if not mask_6mo.any():
-            continue
-        price_6mo = float(symbol_data[mask_6mo].iloc[0]['close'])
-        date_6mo = symbol_data[mask_6mo].iloc[0]['price_date']
-        
-        # Get price 9 months ago
-        target_9mo_date = target_9mo.date()
-        window_start_9mo = (target_9mo - pd.Timedelta(days=7)).date()
-        mask_9mo = (symbol_data['price_date'] <= target_9mo_date) & \
-                   (symbol_data['price_date'] >= window_start_9mo)
-        if not mask_9mo.any():
+        # Get prices 3/6/9/12 months ago (each within a 7-day window) by binary
+        # search over the symbol's ascending dates
+        dates_asc = symbol_data['price_date'].to_numpy()[::-1].astype('datetime64[D]')
+        closes_asc = symbol_data['close'].to_numpy()[::-1]
+        lookback_prices = []
+        for target in (target_3mo, target_6mo, target_9mo, target_12mo):
+            idx = find_price_in_window(dates_asc, target.date(), (target - pd.Timedelta(days=7)).date())
+            if idx is None:
+                break
+            lookback_prices.append((float(closes_asc[idx]), dates_asc[idx].item()))
+        if len(lookback_prices) < 4:
             continue
-        price_9mo = float(symbol_data[mask_9mo].iloc[0]['close'])
-        date_9mo = symbol_data[mask_9mo].iloc[0]['price_date']
-        
-        # Get price 12 months ago
-        target_12mo_date = target_12mo.date()
-        window_start_12mo = (target_12mo - pd.Timedelta(days=7)).date()
-        mask_12mo = (symbol_data['price_date'] <= target_12mo_date) & \
-                    (symbol_data['price_date'] >= window_start_12mo)
-        if not mask_12mo.any():
-            continue
-        price_12mo = float(symbol_data[mask_12mo].iloc[0]['close'])
-        date_12mo = symbol_data[mask_12mo].iloc[0]['price_date']
+        (price_3mo, date_3mo), (price_6mo, date_6mo), (price_9mo, date_9mo), (price_12mo, date_12mo) = lookback_prices
         
         # Calculate percentage changes
         pct_change_3mo = ((current_price - price_3mo) / price_3mo * 100) if price_3mo > 0 else None
@@ -332,55 +339,20 @@ def calculate_and_store_indicators(calc_date=None, batch_size=500):
     
     cursor = conn.cursor()
     try:
-        # Get all weighted_change values for this date
-        cursor.execute("""
-            SELECT symbol, weighted_change
-            FROM stock_indicators
-            WHERE calculation_date = %s
-              AND weighted_change IS NOT NULL
-            ORDER BY weighted_change DESC
-        """, (calc_date,))
+        # Rank and update in one statement - nothing is shipped to Python
+        cursor.execute(RS_RATING_UPDATE_SQL, (calc_date, calc_date))
         
-        all_results = cursor.fetchall()
+        updated_count, min_rating, max_rating = cursor.fetchone()
         
-        if not all_results:
+        if not updated_count:
             print("  ⚠ No data found for percentile ranking")
             return
         
-        # Convert to DataFrame for easy percentile calculation
-        df = pd.DataFrame(all_results, columns=['symbol', 'weighted_change'])
-        
-        # Calculate percentile rank (1-99 scale)
-        # Higher weighted_change = higher rank
-        df['rs_rating'] = df['weighted_change'].rank(pct=True, method='min')
-        df['rs_rating'] = (df['rs_rating'] * 98 + 1).round().astype(int)
-        df['rs_rating'] = df['rs_rating'].clip(1, 99)
-        
-        # Update rs_rating in database
-        update_values = [
-            (row['rs_rating'], row['symbol'], calc_date)
-            for _, row in df.iterrows()
-        ]
-        
-        execute_values(
-            cursor,
-            """
-            UPDATE stock_indicators
-            SET rs_rating = v.rs_rating
-            FROM (VALUES %s) AS v(rs_rating, symbol, calculation_date)
-            WHERE stock_indicators.symbol = v.symbol
-              AND stock_indicators.calculation_date = v.calculation_date
-            """,
-            update_values,
-            page_size=1000,
-            template="(%s::INTEGER, %s::TEXT, %s::DATE)"
-        )
-        
         conn.commit()
         cursor.close()
         
-        print(f"  ✓ Updated rs_rating for {len(df)} symbols")
-        print(f"    RS Rating range: {df['rs_rating'].min()} - {df['rs_rating'].max()}")
+        print(f"  ✓ Updated rs_rating for {updated_count} symbols")
+        print(f"    RS Rating range: {min_rating} - {max_rating}")
         
     except Exception as e:
         conn.rollback()
@@ -407,21 +379,14 @@ def calculate_and_store_indicators_for_all_dates(batch_size=500, start_date=None
     print(f"STOCK INDICATORS CALCULATION - ALL DATES")
     print(f"{'='*70}")
     
-    # Get all dates
-    all_dates = get_all_dates_with_prices()
-    
-    if not all_dates:
-        print("No dates found in database")
-        return
-    
-    # Filter by date range if provided
-    if start_date:
-        all_dates = [d for d in all_dates if d >= start_date]
-    if end_date:
-        all_dates = [d for d in all_dates if d <= end_date]
+    # Get all dates in the requested range (filtered in SQL)
+    all_dates = get_all_dates_with_prices(since=start_date, until=end_date)
     
     if not all_dates:
-        print(f"No dates in specified range")
+        if start_date or end_date:
+            print(f"No dates in specified range")
+        else:
+            print("No dates found in database")
         return
     
     print(f"\nFound {len(all_dates)} dates to process")
@@ -4,15 +4,20 @@ from typing import Any
 from dotenv import load_dotenv
 import time
 import pandas as pd
+import numpy as np
 import yfinance as yf
 import os
 import psycopg2
 from datetime import datetime, timedelta
-from psycopg2.extras import execute_values
+from psycopg2.extras import execute_values, execute_batch
 import sys
 import io
+import functools
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from store_stock_data import get_db_connection, get_all_us_tickers
+import queue
+from collections import Counter
+import threading
+from store_stock_data import get_db_connection, get_db_pool, get_all_us_tickers
 import pytz
 
 # Fix Windows Unicode encoding issues AND disable buffering
@@ -31,19 +36,150 @@ if sys.platform == 'win32':
 
 load_dotenv()
 
+# Prices at or above this overflow DECIMAL(16, 4) and are treated as bad data
+MAX_PRICE_LIMIT = 10**12
+
+# execute_values row template for (timestamp, symbol, open, high, low, close, volume)
+OHLCV_ROW_TEMPLATE = "(%s, %s, %s, %s, %s, %s, %s)"
+
+# Rows per INSERT statement for the per-ticker fallback paths
+FALLBACK_PAGE_SIZE = 1000
+
+# Worker threads for per-symbol metadata lookups
+PREPARE_WORKERS = 8
+
+# Pooled connections / threads used by the per-symbol lookback fallback
+LOOKBACK_FALLBACK_WORKERS = 8
+
+# Price mismatches echoed to the console during corporate action detection
+CONSOLE_MISMATCH_LIMIT = 20
+
+# Yahoo country names mapped to ISO codes for the tickers table
+COUNTRY_ISO_CODES = {
+    'United States': 'USA',
+    'Canada': 'CAN',
+    'United Kingdom': 'GBR',
+    'Germany': 'DEU',
+    'France': 'FRA',
+    'Japan': 'JPN',
+    'China': 'CHN',
+    'India': 'IND',
+    'Australia': 'AUS',
+    'Brazil': 'BRA',
+    'Mexico': 'MEX',
+    'South Korea': 'KOR',
+    'Spain': 'ESP',
+    'Italy': 'ITA',
+    'Netherlands': 'NLD',
+    'Switzerland': 'CHE',
+    'Sweden': 'SWE',
+    'Belgium': 'BEL',
+    'Ireland': 'IRL',
+    'Israel': 'ISR',
+}
+
+# Sets first_date, last_date and record_count for one reloaded (max) ticker
+MAX_TICKER_UPDATE_SQL = """
+    UPDATE tickers 
+    SET first_date = %s,
+        last_date = %s,
+        record_count = %s,
+        last_updated = NOW()
+    WHERE symbol = %s
+"""
+
+# Same update for a whole batch of reloaded tickers in one statement;
+# rows are (symbol, first_date, last_date, record_count)
+MAX_TICKER_BATCH_UPDATE_SQL = """
+    UPDATE tickers AS t
+    SET first_date = v.first_date,
+        last_date = v.last_date,
+        record_count = v.record_count,
+        last_updated = NOW()
+    FROM (VALUES %s) AS v(symbol, first_date, last_date, record_count)
+    WHERE t.symbol = v.symbol
+"""
+
+# Registers new tickers; rows are (symbol, asset_type, country, first_date, last_date, record_count)
+NEW_TICKER_INSERT_SQL = """
+    INSERT INTO tickers (symbol, asset_type, country, first_date, last_date, record_count, last_updated)
+    VALUES %s
+    ON CONFLICT (symbol) DO NOTHING
+"""
+NEW_TICKER_ROW_TEMPLATE = "(%s, %s, %s, %s, %s, %s, NOW())"
+
+# Yahoo exchange suffixes (e.g. SHOP.TO) mapped to ISO country codes
+EXCHANGE_SUFFIX_COUNTRIES = {
+    'TO': 'CAN', 'V': 'CAN', 'NE': 'CAN',
+    'L': 'GBR',
+    'DE': 'DEU', 'F': 'DEU',
+    'PA': 'FRA',
+    'T': 'JPN',
+    'SS': 'CHN', 'SZ': 'CHN',
+    'NS': 'IND', 'BO': 'IND',
+    'AX': 'AUS',
+    'SA': 'BRA',
+    'MX': 'MEX',
+    'KS': 'KOR', 'KQ': 'KOR',
+    'MC': 'ESP',
+    'MI': 'ITA',
+    'AS': 'NLD',
+    'SW': 'CHE',
+    'ST': 'SWE',
+    'BR': 'BEL',
+    'IR': 'IRL',
+    'TA': 'ISR',
+}
+
+# Refreshes last_date and record_count for lookback-day tickers from the price
+# table, in one grouped scan instead of a COUNT(*) subquery per ticker
+TICKER_STATS_REFRESH_SQL = """
+    UPDATE tickers AS t
+    SET last_date = s.last_date,
+        record_count = s.record_count,
+        last_updated = NOW()
+    FROM (
+        SELECT symbol, MAX(timestamp)::DATE AS last_date, COUNT(*) AS record_count
+        FROM yahoo_adjusted_stock_prices
+        WHERE symbol = ANY(%s)
+        GROUP BY symbol
+    ) AS s
+    WHERE t.symbol = s.symbol
+"""
+
 def get_symbols_in_db(conn):
-    """Get set of symbols that have data in database - uses fast tickers table"""
-    cursor = conn.cursor()
-    cursor.execute("SELECT symbol FROM tickers")
-    symbols = set(row[0] for row in cursor.fetchall())
-    cursor.close()
-    return symbols
+    """Get set of symbols that have data in database - uses fast tickers table
+    
+    Streams rows through a server-side cursor so the full result list is never
+    materialized alongside the set.
+    """
+    cursor = conn.cursor(name='symbols_in_db')
+    cursor.itersize = 10000
+    try:
+        cursor.execute("SELECT symbol FROM tickers")
+        return frozenset(row[0] for row in cursor)
+    finally:
+        cursor.close()
+
+@functools.lru_cache(maxsize=512)
+def _ticker(symbol):
+    """Cached yf.Ticker so repeat lookups for a symbol share one object"""
+    return yf.Ticker(symbol)
+
+@functools.lru_cache(maxsize=512)
+def _ticker_info(symbol):
+    """Cached .info lookup (one HTTP round trip per symbol per run)"""
+    return _ticker(symbol).info
+
+@functools.lru_cache(maxsize=512)
+def _ticker_actions(symbol):
+    """Cached .actions lookup - callers must not mutate the returned DataFrame"""
+    return _ticker(symbol).actions
 
 def has_recent_corporate_actions(symbol, days=5):
     """Check if symbol has corporate actions in the past N days"""
     try:
-        ticker = yf.Ticker(symbol)
-        actions = ticker.actions
+        actions = _ticker_actions(symbol)
         
         if actions.empty:
             return False
@@ -52,33 +188,312 @@ def has_recent_corporate_actions(symbol, days=5):
         cutoff_date = datetime.now() - timedelta(days=days)
         
         # Make cutoff_date timezone-aware to match actions index
-        # Or convert actions index to timezone-naive
-        if actions.index.tz is not None:
+        # Or convert actions index to timezone-naive (without touching the cached frame)
+        action_dates = actions.index
+        if action_dates.tz is not None:
             # Actions index is timezone-aware, convert to naive
-            actions.index = actions.index.tz_localize(None)
-        
-        recent_actions = actions[actions.index > cutoff_date]
+            action_dates = action_dates.tz_localize(None)
         
-        return not recent_actions.empty
+        return bool((action_dates > cutoff_date).any())
     except Exception as e:
         # If we can't check, assume no corporate actions
         print(f"  Warning: Could not check corporate actions for {symbol}: {e}")
         return False
 
-def normalize_timestamp(dt):
-    """Convert any timestamp to timezone-naive datetime for database storage
+def get_symbol_frame(data, symbol):
+    """Get one symbol's OHLCV frame out of a yf.download result
+    
+    Args:
+        data: DataFrame from yf.download (MultiIndex (ticker, field) columns for
+              group_by='ticker', or flat columns for a single ticker's frame)
+        symbol: Ticker symbol
+    
+    Returns:
+        DataFrame for the symbol, or None if the symbol is not in the download
+    """
+    if not isinstance(data.columns, pd.MultiIndex):
+        # Single ticker download
+        return data
+    try:
+        return data[symbol]
+    except KeyError:
+        return None
+
+def to_naive_datetimes(index):
+    """Convert a DatetimeIndex to an array of timezone-naive datetimes in one call
     
     Args:
-        dt: pandas Timestamp or datetime object (may have timezone)
+        index: pandas DatetimeIndex (may have timezone)
     
     Returns:
-        datetime object without timezone (naive)
+        numpy object array of naive datetime objects
     """
-    if hasattr(dt, 'to_pydatetime'):
-        dt = dt.to_pydatetime()
-    if hasattr(dt, 'tzinfo') and dt.tzinfo is not None:
-        return dt.replace(tzinfo=None)
-    return dt
+    if getattr(index, 'tz', None) is not None:
+        index = index.tz_localize(None)
+    return index.to_pydatetime()
+
+def build_ohlcv_values(symbol, df):
+    """Convert one ticker's OHLCV DataFrame into rows for yahoo_adjusted_stock_prices
+    
+    Rows without Open or Close are skipped. Yahoo occasionally reports absurd prices
+    (>= 10^12) in old history, so everything up to and including the most recent such
+    date is dropped (same rule as the batched insert paths).
+    
+    Args:
+        symbol: Ticker symbol
+        df: DataFrame with Open, High, Low, Close, Volume columns indexed by date
+    
+    Returns:
+        List of (timestamp, symbol, open, high, low, close, volume) tuples, oldest first
+    """
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    if df.index.has_duplicates:
+        # A repeated date would violate the primary key (or hit the same row twice in one upsert)
+        df = df[~df.index.duplicated(keep='last')]
+    
+    # Convert the whole index and each column once instead of per row
+    dates = to_naive_datetimes(df.index)
+    prices = df[['Open', 'High', 'Low', 'Close']].to_numpy(dtype='float64')
+    volumes = np.nan_to_num(df['Volume'].to_numpy(dtype='float64')).astype('int64')
+    valid = ~np.isnan(prices[:, 0]) & ~np.isnan(prices[:, 3])
+    
+    # Keep only rows after the most recent out-of-range price (if any)
+    out_of_range = np.flatnonzero(valid & (np.abs(prices) >= MAX_PRICE_LIMIT).any(axis=1))
+    if len(out_of_range):
+        valid[:out_of_range[-1] + 1] = False
+    
+    prices = prices[valid]
+    return list(zip(
+        dates[valid].tolist(), [symbol] * len(prices),
+        prices[:, 0].tolist(), prices[:, 1].tolist(), prices[:, 2].tolist(), prices[:, 3].tolist(),
+        volumes[valid].tolist()
+    ))
+
+def build_batch_ohlcv_values(data, symbols):
+    """Convert a multi-ticker yf.download result into price rows in one vectorized pass
+    
+    Each OHLCV field is pulled out as a (dates x symbols) array and flattened
+    symbol-major, so no per-row Python work happens until the final tuple zip.
+    Rows without Open or Close are skipped; a missing Volume is stored as 0.
+    Duplicate dates keep the last row, and rows come out sorted by (symbol, timestamp).
+    
+    Args:
+        data: DataFrame from yf.download (MultiIndex (ticker, field) columns, or
+              flat columns for a single ticker's frame)
+        symbols: Ticker symbols to extract (symbols missing from data are ignored)
+    
+    Returns:
+        (values, last_dates): list of (timestamp, symbol, open, high, low, close, volume)
+        tuples, and {symbol: most recent timestamp} for every symbol with rows
+    """
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    if data.index.has_duplicates:
+        # Same (symbol, date) twice would make ON CONFLICT DO UPDATE hit one row twice
+        data = data[~data.index.duplicated(keep='last')]
+    
+    fields = ['Open', 'High', 'Low', 'Close', 'Volume']
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(0))
+        # Sorted so rows arrive in (symbol, timestamp) primary key order
+        symbols = sorted(s for s in set(symbols) if s in available)
+        if not symbols:
+            return [], {}
+        frame = data[symbols]
+        arrays = [
+            frame.xs(field, axis=1, level=1).reindex(columns=symbols).to_numpy(dtype='float64').T.ravel()
+            for field in fields
+        ]
+    else:
+        # Single ticker download
+        symbols = list(symbols)[:1]
+        if not symbols:
+            return [], {}
+        arrays = [data[field].to_numpy(dtype='float64') for field in fields]
+    opens, highs, lows, closes, volumes = arrays
+    
+    dates = to_naive_datetimes(data.index)
+    n_dates = len(dates)
+    
+    timestamps = np.tile(dates, len(symbols))
+    symbol_col = np.repeat(np.array(symbols, dtype=object), n_dates)
+    valid = ~np.isnan(opens) & ~np.isnan(closes)
+    volumes = np.nan_to_num(volumes).astype('int64')
+    
+    values = list(zip(
+        timestamps[valid].tolist(), symbol_col[valid].tolist(),
+        opens[valid].tolist(), highs[valid].tolist(), lows[valid].tolist(), closes[valid].tolist(),
+        volumes[valid].tolist()
+    ))
+    
+    # Last valid date per symbol: first True scanning each symbol's row from the end
+    valid_by_symbol = valid.reshape(len(symbols), n_dates)
+    has_rows = valid_by_symbol.any(axis=1)
+    last_pos = n_dates - 1 - valid_by_symbol[:, ::-1].argmax(axis=1)
+    last_dates = {symbol: dates[pos] for symbol, pos, ok in zip(symbols, last_pos, has_rows) if ok}
+    
+    return values, last_dates
+
+def prepare_symbol_values(symbol, df, log, action):
+    """Build one symbol's price rows and tickers metadata
+    
+    Args:
+        symbol: Ticker symbol
+        df: The symbol's OHLCV DataFrame
+        log: Log file handle
+        action: Label for log lines ('new', 'max', ...)
+    
+    Returns:
+        (symbol, values, metadata) where metadata is (first_date, last_date, record_count);
+        (symbol, [], None) if the symbol has no rows or they couldn't be built
+    """
+    try:
+        if df.empty or not df['Close'].notna().any():
+            return symbol, [], None
+        
+        symbol_values = build_ohlcv_values(symbol, df)
+        if not symbol_values:
+            return symbol, [], None
+        
+        metadata = (symbol_values[0][0], symbol_values[-1][0], len(symbol_values))
+        return symbol, symbol_values, metadata
+    except Exception as e:
+        log.write(f"  ✗ {symbol} ({action}): Error collecting data: {e}\n")
+        return symbol, [], None
+
+def collect_batch_values(data, batch, log, action, fetch_metadata=False, max_workers=PREPARE_WORKERS):
+    """Prepare a batch of symbols
+    
+    With fetch_metadata, (asset_type, country) is looked up once for the whole
+    batch (concurrently, max_workers threads) and appended to each symbol's
+    metadata tuple.
+    
+    Returns:
+        (all_values, ticker_metadata): combined rows and {symbol: metadata tuple}
+    """
+    all_values = []
+    ticker_metadata = {}
+    
+    # Resolve the column layout and slice every symbol's frame once per batch
+    if isinstance(data.columns, pd.MultiIndex):
+        present = set(data.columns.get_level_values(0))
+        per_symbol = {symbol: data[symbol] for symbol in batch if symbol in present}
+    else:
+        # Single ticker download
+        per_symbol = {symbol: data for symbol in batch}
+    
+    for symbol, df in per_symbol.items():
+        symbol, symbol_values, metadata = prepare_symbol_values(symbol, df, log, action)
+        if metadata is not None:
+            all_values.extend(symbol_values)
+            ticker_metadata[symbol] = metadata
+    
+    if fetch_metadata and ticker_metadata:
+        lookups = get_ticker_metadata_bulk(ticker_metadata, max_workers=max_workers)
+        ticker_metadata = {symbol: metadata + lookups[symbol] for symbol, metadata in ticker_metadata.items()}
+    return all_values, ticker_metadata
+
+def bulk_copy_ohlcv(cursor, values, table='yahoo_adjusted_stock_prices'):
+    """Stream OHLCV rows into a table with a single COPY FROM STDIN
+    
+    Rows are written in COPY's native text format with prices pre-rounded to the
+    column scale (DECIMAL(16, 4)), which is cheaper to build than CSV and gives the
+    server shorter numerics to parse. Ticker symbols never contain tabs, newlines
+    or backslashes, so no escaping is needed.
+    
+    Args:
+        cursor: Database cursor
+        values: Iterable of (timestamp, symbol, open, high, low, close, volume) tuples
+        table: Target table (default: yahoo_adjusted_stock_prices)
+    """
+    buf = io.StringIO()
+    buf.writelines(
+        f"{ts.isoformat(' ')}\t{symbol}\t{o:.4f}\t{h:.4f}\t{l:.4f}\t{c:.4f}\t{v}\n"
+        for ts, symbol, o, h, l, c, v in values
+    )
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} (timestamp, symbol, open, high, low, close, volume) FROM STDIN",
+        buf
+    )
+
+def copy_new_ticker_prices(cursor, values):
+    """COPY price rows for new tickers, skipping rows already in the table
+    
+    COPY has no ON CONFLICT, so rows go into a session temp table first and are
+    moved over with INSERT ... ON CONFLICT DO NOTHING.
+    
+    Returns:
+        Number of rows actually inserted
+    """
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS yahoo_prices_stage
+        (LIKE yahoo_adjusted_stock_prices INCLUDING DEFAULTS)
+        ON COMMIT DELETE ROWS
+    """)
+    # Every batch of the new-ticker phase shares one transaction, so clear the stage per call
+    cursor.execute("TRUNCATE yahoo_prices_stage")
+    bulk_copy_ohlcv(cursor, values, table='yahoo_prices_stage')
+    cursor.execute("""
+        INSERT INTO yahoo_adjusted_stock_prices 
+        (timestamp, symbol, open, high, low, close, volume)
+        SELECT timestamp, symbol, open, high, low, close, volume
+        FROM yahoo_prices_stage
+        ON CONFLICT (symbol, timestamp) DO NOTHING
+    """)
+    return cursor.rowcount
+
+def write_new_ticker_batch(cursor, values, metadata):
+    """COPY a batch of new tickers' prices and register them in the tickers table
+    
+    Args:
+        cursor: Database cursor (caller commits)
+        values: List of (timestamp, symbol, open, high, low, close, volume) tuples
+        metadata: {symbol: (first_date, last_date, record_count)}
+    """
+    copy_new_ticker_prices(cursor, values)
+    
+    lookups = get_ticker_metadata_bulk(metadata)
+    
+    ticker_records = [
+        (symbol,) + lookups[symbol] + (first_date, last_date, record_count)
+        for symbol, (first_date, last_date, record_count) in metadata.items()
+    ]
+    
+    execute_values(cursor, NEW_TICKER_INSERT_SQL, ticker_records,
+                   template=NEW_TICKER_ROW_TEMPLATE, page_size=1000)
+
+def replace_max_ticker_batch(cursor, values, metadata):
+    """Replace a batch of max tickers' full history with one DELETE and one COPY
+    
+    Args:
+        cursor: Database cursor (caller commits)
+        values: List of (timestamp, symbol, open, high, low, close, volume) tuples
+        metadata: {symbol: (first_date, last_date, record_count)}
+    """
+    cursor.execute(
+        "DELETE FROM yahoo_adjusted_stock_prices WHERE symbol = ANY(%s)",
+        (list(metadata),)
+    )
+    bulk_copy_ohlcv(cursor, values)
+    update_max_ticker_metadata(cursor, metadata)
+
+def update_max_ticker_metadata(cursor, metadata):
+    """Set first_date, last_date and record_count for a batch of reloaded tickers
+    in one UPDATE ... FROM (VALUES ...) statement
+    
+    Args:
+        cursor: Database cursor (caller commits)
+        metadata: {symbol: (first_date, last_date, record_count)}
+    """
+    execute_values(
+        cursor,
+        MAX_TICKER_BATCH_UPDATE_SQL,
+        [(symbol,) + dates_and_count for symbol, dates_and_count in metadata.items()],
+        template="(%s, %s::date, %s::date, %s::integer)",
+        page_size=1000
+    )
 
 def process_incremental_batch(batch_data, batch_tickers, new_tickers, max_tickers, conn, log):
     """Process a single batch of downloaded data incrementally (for 'max' period to save memory)
@@ -92,66 +507,107 @@ def process_incremental_batch(batch_data, batch_tickers, new_tickers, max_ticker
         log: Log file handle
     
     Returns:
-        Dictionary with stats: {'new_success': int, 'new_records': int, 'max_success': int, 'max_records': int}
+        Dictionary with stats: {'new_success': int, 'new_records': int, 'new_failed': int,
+                                'max_success': int, 'max_records': int, 'max_failed': int,
+                                'failed_tickers': [(symbol, category, error)]}
     """
     print(f"      [DEBUG] process_incremental_batch called with {len(batch_tickers)} tickers")
-    stats = {'new_success': 0, 'new_records': 0, 'max_success': 0, 'max_records': 0}
+    stats = {'new_success': 0, 'new_records': 0, 'new_failed': 0,
+             'max_success': 0, 'max_records': 0, 'max_failed': 0,
+             'failed_tickers': []}
     
     # Separate batch tickers into new and max
-    batch_new = [s for s in batch_tickers if s in new_tickers]
-    batch_max = [s for s in batch_tickers if s in max_tickers]
-    
-    # Process new tickers from this batch
-    if batch_new:
-        print(f"      Processing {len(batch_new)} new tickers...")  # ADD THIS
-        for idx, symbol in enumerate(batch_new,1):
+    batch_symbols = set(batch_tickers)
+    batch_new = batch_symbols & new_tickers
+    batch_max = batch_symbols & max_tickers
+    
+    # Slice each symbol's frame out of the batch once, up front
+    if isinstance(batch_data.columns, pd.MultiIndex):
+        available = set(batch_data.columns.get_level_values(0))
+        symbol_frames = {s: batch_data[s] for s in available & (batch_new | batch_max)}
+    else:
+        # Flat columns: yfinance returned a single ticker's frame
+        symbol_frames = {s: batch_data for s in batch_new | batch_max}
+    
+    # Each action collects all its rows, writes them in one transaction, and falls
+    # back to the per-symbol function if the batch write fails
+    actions = [
+        ('new', batch_new, write_new_ticker_batch, insert_ticker_data,
+         flush_new_ticker_rows),
+        ('max', batch_max, replace_max_ticker_batch, delete_and_insert_ticker_data,
+         lambda conn, pending: flush_ticker_updates(conn, pending, MAX_TICKER_UPDATE_SQL)),
+    ]
+    
+    for action, symbols, write_batch, write_symbol, flush_pending in actions:
+        if not symbols:
+            continue
+        
+        print(f"      Processing {len(symbols)} {action} tickers...")
+        values = []
+        metadata = {}  # {symbol: (first_date, last_date, record_count)}
+        frames = {}
+        for idx, symbol in enumerate(symbols, 1):
             if idx % 50 == 0:  # Print every 50 symbols
-                print(f"        Progress: {idx}/{len(batch_new)} new tickers...")
+                print(f"        Progress: {idx}/{len(symbols)} {action} tickers...")
             try:
-                # Extract data for this symbol
-                if len(batch_data.columns.levels[0]) > 1 if hasattr(batch_data.columns, 'levels') else False:
-                    if symbol not in batch_data.columns.levels[0]:
-                        continue
-                    df = batch_data[symbol]
-                else:
-                    df = batch_data
-                
-                if df.empty or df.dropna().empty:
+                df = symbol_frames.get(symbol)
+                if df is None:
                     continue
                 
-                # Process using existing insert_ticker_data function
-                success, records = insert_ticker_data(conn, symbol, df, log)
-                if success:
-                    stats['new_success'] += 1
-                    stats['new_records'] += records
-            except Exception as e:
-                log.write(f"  ✗ {symbol} (new, incremental): {e}\n")
-    
-    # Process max tickers from this batch
-    if batch_max:
-        print(f"      Processing {len(batch_max)} max tickers...")  # ADD THIS
-        for idx, symbol in enumerate(batch_max,1):
-            if idx % 50 == 0:  # Print every 50 symbols
-                print(f"        Progress: {idx}/{len(batch_max)} max tickers...")
-            try:
-                # Extract data for this symbol
-                if len(batch_data.columns.levels[0]) > 1 if hasattr(batch_data.columns, 'levels') else False:
-                    if symbol not in batch_data.columns.levels[0]:
-                        continue
-                    df = batch_data[symbol]
-                else:
-                    df = batch_data
-                
-                if df.empty or df.dropna().empty:
+                if df.empty or not df['Close'].notna().any():
                     continue
                 
-                # Process using existing delete_and_insert_ticker_data function
-                success, records = delete_and_insert_ticker_data(conn, symbol, df, log)
-                if success:
-                    stats['max_success'] += 1
-                    stats['max_records'] += records
+                symbol_values = build_ohlcv_values(symbol, df)
+                if not symbol_values:
+                    continue
+                values.extend(symbol_values)
+                metadata[symbol] = (symbol_values[0][0], symbol_values[-1][0], len(symbol_values))
+                frames[symbol] = df
             except Exception as e:
-                log.write(f"  ✗ {symbol} (max, incremental): {e}\n")
+                log.write(f"  ✗ {symbol} ({action}, incremental): {e}\n")
+        
+        if not values:
+            continue
+        
+        cursor = conn.cursor()
+        try:
+            write_batch(cursor, values, metadata)
+            conn.commit()
+            cursor.close()
+            stats[f'{action}_success'] += len(metadata)
+            stats[f'{action}_records'] += len(values)
+            log.write(f" {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: ✓ {len(metadata)} {action} tickers (incremental COPY): {len(values)} records\n")
+        except Exception as e:
+            conn.rollback()
+            cursor.close()
+            log.write(f"  ✗ Batch COPY ({action}, incremental) failed, retrying per symbol: {e}\n")
+            # Retry symbol by symbol (each in its own savepoint) so one bad ticker
+            # doesn't sink the batch; metadata writes are flushed once at the end
+            pending = []
+            fallback_records = {}
+            for symbol, df in frames.items():
+                try:
+                    success, records = write_symbol(conn, symbol, df, log, pending)
+                    if success:
+                        fallback_records[symbol] = records
+                    else:
+                        stats[f'{action}_failed'] += 1
+                        stats['failed_tickers'].append((symbol, action, 'No data available'))
+                except Exception as e2:
+                    stats[f'{action}_failed'] += 1
+                    stats['failed_tickers'].append((symbol, action, str(e2)))
+                    log.write(f"  ✗ {symbol} ({action}, incremental): {e2}\n")
+            try:
+                flush_pending(conn, pending)
+                conn.commit()
+                stats[f'{action}_success'] += len(fallback_records)
+                stats[f'{action}_records'] += sum(fallback_records.values())
+            except Exception as e2:
+                conn.rollback()
+                log.write(f"  ✗ Fallback commit ({action}, incremental) failed: {e2}\n")
+                stats[f'{action}_failed'] += len(fallback_records)
+                for symbol in fallback_records:
+                    stats['failed_tickers'].append((symbol, action, str(e2)))
     
     return stats
 
@@ -164,7 +620,9 @@ def download_data_in_batches(tickers, period='max', batch_size=200, delay=2, pro
         batch_size: Number of tickers per batch (default 200)
         delay: Seconds to wait between batches (default 2)
         process_callback: Optional function(batch_data, batch_tickers) to process each batch immediately.
-                         If provided and period=='max', batches are processed incrementally instead of combined.
+                         If provided, batches are streamed to the callback and released instead of
+                         being held in memory and combined (works for any period). The callback
+                         runs on a background writer thread while the next batch downloads.
     
     Returns:
         Combined DataFrame with all ticker data (or None if process_callback used)
@@ -175,17 +633,47 @@ def download_data_in_batches(tickers, period='max', batch_size=200, delay=2, pro
     # Set up New York timezone
     ny_tz = pytz.timezone('America/New_York')
     
-    # For 'max' period with callback, process incrementally to save memory
-    if period == 'max' and process_callback is not None:
+    streaming = process_callback is not None
+    if streaming:
         print(f"  Downloading {len(tickers)} tickers in batches of {batch_size} (incremental processing)...")
-        total_batches = (len(tickers) + batch_size - 1) // batch_size
-        
-        for i in range(0, len(tickers), batch_size):
-            batch = tickers[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            
+    else:
+        print(f"  Downloading {len(tickers)} tickers in batches of {batch_size}...")
+    
+    all_data = []
+    batches = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+    total_batches = len(batches)
+    
+    # Downloads run on this thread; a writer thread drains a bounded queue into
+    # process_callback so the DB write of batch N overlaps the download of batch N+1
+    write_queue = queue.Queue(maxsize=2)
+    
+    def db_writer_loop():
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            batch_num, batch_data, batch, batch_duration = item
+            del item
+            try:
+                print(f"    Processing batch {batch_num}...")
+                process_callback(batch_data, batch)
+                batch_end_time = datetime.now(ny_tz).strftime('%H:%M:%S')
+                print(f"    ✓ Batch {batch_num} downloaded and processed ({batch_duration:.1f}s download) at {batch_end_time} ET")
+            except Exception as e:
+                print(f"    ✗ Batch {batch_num} processing error: {e}")
+            # Release the frame before waiting on the next batch
+            del batch_data
+    
+    writer = None
+    if streaming:
+        writer = threading.Thread(target=db_writer_loop, name='db-writer', daemon=True)
+        writer.start()
+    
+    try:
+        for batch_num, batch in enumerate(batches, 1):
             print(f"    Batch {batch_num}/{total_batches}: Downloading {len(batch)} tickers...")
             batch_start = time.time()
+            batch_data = None
             
             try:
                 batch_data = yf.download(
@@ -197,22 +685,15 @@ def download_data_in_batches(tickers, period='max', batch_size=200, delay=2, pro
                 )
                 batch_duration = time.time() - batch_start
                 batch_end_time = datetime.now(ny_tz).strftime('%H:%M:%S')
-                # ADD DEBUG OUTPUT HERE
-                print(f"    Batch {batch_num} download completed. Checking data...")
-                print(f"      batch_data is None: {batch_data is None}")
                 
-                if batch_data is not None:
-                    print(f"      batch_data.empty: {batch_data.empty}")
-                    print(f"      batch_data.shape: {batch_data.shape}")
-
-                    if hasattr(batch_data.columns, 'levels'):
-                        print(f"      Multi-level columns: {len(batch_data.columns.levels[0]) if len(batch_data.columns.levels) > 0 else 0}")
-
                 if batch_data is not None and not batch_data.empty:
-                    # Process immediately via callback
-                    print(f"    Processing batch {batch_num}...")  # ADD THIS LINE
-                    process_callback(batch_data, batch)
-                    print(f"    ✓ Batch {batch_num} downloaded and processed ({batch_duration:.1f}s) at {batch_end_time} ET")
+                    if streaming:
+                        print(f"    Batch {batch_num} download completed, shape {batch_data.shape}")
+                        # Blocks while two batches are already waiting, bounding memory
+                        write_queue.put((batch_num, batch_data, batch, batch_duration))
+                    else:
+                        all_data.append(batch_data)
+                        print(f"    ✓ Batch {batch_num} complete ({batch_duration:.1f}s) at {batch_end_time} ET")
                 else:
                     print(f"    ⚠ Batch {batch_num} returned no data ({batch_duration:.1f}s) at {batch_end_time} ET")
                     
@@ -221,52 +702,22 @@ def download_data_in_batches(tickers, period='max', batch_size=200, delay=2, pro
                 batch_end_time = datetime.now(ny_tz).strftime('%H:%M:%S')
                 print(f"    ✗ Batch {batch_num} error: {e} ({batch_duration:.1f}s) at {batch_end_time} ET")
             
+            # Drop our reference so a streamed batch can be freed once it is written
+            del batch_data
+            
             # Delay between batches to avoid rate limiting
-            if i + batch_size < len(tickers):
+            if batch_num < total_batches:
                 time.sleep(delay)
-        
+    finally:
+        if writer is not None:
+            # Sentinel: let the writer finish the queued batches, then wait for it
+            write_queue.put(None)
+            writer.join()
+    
+    if streaming:
         # Return None to indicate incremental processing was used
         return None
     
-    # Original behavior: combine all batches (for shorter periods or no callback)
-    print(f"  Downloading {len(tickers)} tickers in batches of {batch_size}...")
-    
-    all_data = []
-    total_batches = (len(tickers) + batch_size - 1) // batch_size
-    
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        
-        print(f"    Batch {batch_num}/{total_batches}: Downloading {len(batch)} tickers...")
-        batch_start = time.time()
-        
-        try:
-            batch_data = yf.download(
-                batch,
-                period=period,
-                group_by='ticker',
-                auto_adjust=True,
-                threads=True
-            )
-            batch_duration = time.time() - batch_start
-            batch_end_time = datetime.now(ny_tz).strftime('%H:%M:%S')
-            
-            if batch_data is not None and not batch_data.empty:
-                all_data.append(batch_data)
-                print(f"    ✓ Batch {batch_num} complete ({batch_duration:.1f}s) at {batch_end_time} ET")
-            else:
-                print(f"    ⚠ Batch {batch_num} returned no data ({batch_duration:.1f}s) at {batch_end_time} ET")
-                
-        except Exception as e:
-            batch_duration = time.time() - batch_start
-            batch_end_time = datetime.now(ny_tz).strftime('%H:%M:%S')
-            print(f"    ✗ Batch {batch_num} error: {e} ({batch_duration:.1f}s) at {batch_end_time} ET")
-        
-        # Delay between batches to avoid rate limiting
-        if i + batch_size < len(tickers):
-            time.sleep(delay)
-    
     # Combine all batches
     if not all_data:
         return None
@@ -274,49 +725,58 @@ def download_data_in_batches(tickers, period='max', batch_size=200, delay=2, pro
     if len(all_data) == 1:
         return all_data[0]
     
-    # Concatenate along columns for multi-ticker data
+    # Concatenate along columns for multi-ticker data, releasing the pieces right away
+    # so only the combined frame survives
     print(f"  Combining {len(all_data)} batches...")
     combined = pd.concat(all_data, axis=1)
+    all_data.clear()
     return combined
 
+@functools.lru_cache(maxsize=None)
+def _lookup_ticker_metadata(symbol):
+    """Cached (asset_type, country) lookup; raises on failure so errors are never cached"""
+    suffix = symbol.rsplit('.', 1)[1].upper() if '.' in symbol else None
+    if suffix is None or suffix in EXCHANGE_SUFFIX_COUNTRIES:
+        country_code = EXCHANGE_SUFFIX_COUNTRIES.get(suffix, 'USA')
+        asset_type = _ticker(symbol).fast_info.quote_type or 'EQUITY'
+        return asset_type, country_code
+    
+    info = _ticker_info(symbol)
+    
+    asset_type = info.get('quoteType', 'EQUITY')
+    country = info.get('country', 'USA')
+    
+    country_code = COUNTRY_ISO_CODES.get(country) or (country if len(country) == 3 else 'USA')
+    
+    return asset_type, country_code
+
 def get_ticker_metadata(symbol):
-    """Get asset type and country for a symbol"""
+    """Get asset type and country for a symbol
+    
+    Country comes from the exchange suffix (no suffix = US listing), so the heavy
+    .info scrape is only needed for unrecognised suffixes. Asset type comes from
+    fast_info, which uses the lightweight chart metadata instead of .info.
+    Only successful lookups are cached; a failed one falls back to ('EQUITY', 'USA')
+    for this call and is tried again next time.
+    """
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        
-        asset_type = info.get('quoteType', 'EQUITY')
-        country = info.get('country', 'USA')
-        
-        # Map country names to ISO codes
-        country_map = {
-            'United States': 'USA',
-            'Canada': 'CAN',
-            'United Kingdom': 'GBR',
-            'Germany': 'DEU',
-            'France': 'FRA',
-            'Japan': 'JPN',
-            'China': 'CHN',
-            'India': 'IND',
-            'Australia': 'AUS',
-            'Brazil': 'BRA',
-            'Mexico': 'MEX',
-            'South Korea': 'KOR',
-            'Spain': 'ESP',
-            'Italy': 'ITA',
-            'Netherlands': 'NLD',
-            'Switzerland': 'CHE',
-            'Sweden': 'SWE',
-            'Belgium': 'BEL',
-            'Ireland': 'IRL',
-            'Israel': 'ISR',
-        }
-        country_code = country_map.get(country, country if len(country) == 3 else 'USA')
-        
-        return asset_type, country_code
-    except:
+        return _lookup_ticker_metadata(symbol)
+    except Exception:
         return 'EQUITY', 'USA'
 
+def get_ticker_metadata_bulk(symbols, max_workers=PREPARE_WORKERS):
+    """Get (asset_type, country) for many symbols in one call
+    
+    Lookups are HTTP calls, so they run concurrently; results are cached per
+    symbol, so a symbol that is retried later in the run is not fetched again.
+    
+    Returns:
+        {symbol: (asset_type, country)}
+    """
+    symbols = list(symbols)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(symbols, executor.map(get_ticker_metadata, symbols)))
+
 def detect_corporate_actions_and_get_data(existing_symbols, conn, lookback_days=5):
     """Detect corporate actions by comparing prices AND cache the lookback data
     
@@ -359,23 +819,39 @@ def detect_corporate_actions_and_get_data(existing_symbols, conn, lookback_days=
     first_date = data_lookback.index[0].to_pydatetime().date()
     print(f"  Comparing prices for date: {first_date}")
     
-    # OPTIMIZATION: Fetch all symbols' prices for that date in ONE query
+    # OPTIMIZATION: Fetch only the symbols we care about for that date in ONE query
+    # (served by the (symbol, timestamp) primary key / idx_timestamp)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT symbol, close 
         FROM yahoo_adjusted_stock_prices
         WHERE timestamp = %s
-    """, (first_date,))
+          AND symbol = ANY(%s)
+    """, (first_date, list(existing_symbols)))
     
-    # Build dictionary - only keep symbols we care about
-    all_prices = cursor.fetchall()
-    db_prices = {row[0]: float(row[1]) for row in all_prices if row[0] in existing_symbols}
+    db_prices = {symbol: float(close) for symbol, close in cursor.fetchall()}
     cursor.close()
     
     print(f"  ✓ Fetched {len(db_prices)} prices from database in single query")
     
-    # Now compare each symbol (no more database queries!)
-    symbols_with_changes = set()
+    # Compare all symbols at once (no more database queries, no per-symbol loop!)
+    # Yahoo close on the first date for every symbol; columns are (symbol, field) with group_by='ticker'
+    if isinstance(data_lookback.columns, pd.MultiIndex):
+        yahoo_close = data_lookback.xs('Close', axis=1, level=1).iloc[0]
+    else:
+        yahoo_close = pd.Series({existing_symbols[0]: data_lookback['Close'].iloc[0]})
+    
+    # Align on symbol; symbols missing on either side (or with no Yahoo close) are skipped
+    aligned = pd.concat(
+        [pd.Series(db_prices, dtype='float64'), yahoo_close.astype('float64')],
+        axis=1, join='inner', keys=['db_close', 'yahoo_close']
+    ).dropna()
+    
+    # Compare prices - ANY difference means adjustment needed (dividends, splits, etc.)
+    aligned['diff_abs'] = (aligned['yahoo_close'] - aligned['db_close']).abs()
+    aligned['diff_pct'] = (aligned['diff_abs'] / aligned['db_close'] * 100).where(aligned['db_close'] > 0, 0.0)
+    mismatches = aligned[aligned['diff_abs'] > 0.001].sort_index()
+    symbols_with_changes = set(mismatches.index)
     
     # Create detailed log file for corporate action detection
     logs_dir = "logs"
@@ -385,46 +861,23 @@ def detect_corporate_actions_and_get_data(existing_symbols, conn, lookback_days=
     with open(log_file_path, 'w', encoding='utf-8') as log:
         log.write(f"Corporate Action Detection - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         log.write(f"Comparing {len(existing_symbols)} symbols for date: {first_date}\n\n")
-        log.write(f"{'Symbol':<10} {'DB Price':>12} {'Yahoo Price':>12} {'Abs Diff':>12} {'% Diff':>10}\n")
         log.write("="*60 + "\n")
         
-        for i, symbol in enumerate(existing_symbols, 1):
-            try:
-                # Get Yahoo data for this symbol
-                if len(existing_symbols) == 1:
-                    df = data_lookback
-                else:
-                    if symbol not in data_lookback.columns.levels[0]:
-                        continue
-                    df = data_lookback[symbol]
-                
-                if df.empty or df.dropna().empty:
-                    continue
-                
-                yahoo_close = float(df['Close'].iloc[0])
-                
-                # Compare with database price (already fetched in bulk)
-                if symbol in db_prices:
-                    db_close = db_prices[symbol]
-                    
-                    # Compare prices - ANY difference means adjustment needed (dividends, splits, etc.)
-                    diff_abs = abs(yahoo_close - db_close)
-                    diff_pct = (diff_abs / db_close * 100) if db_close > 0 else 0
-                    
-                    if diff_abs > 0.001:
-                        symbols_with_changes.add(symbol)
-                        
-                        # Log to file
-                        log.write(f"{symbol:<10} {db_close:>12.4f} {yahoo_close:>12.4f} {diff_abs:>12.4f} {diff_pct:>9.2f}%\n")
-                        
-                        # Print to console
-                        print(f"    {symbol}: DB=${db_close:.2f}, Yahoo=${yahoo_close:.2f} (${diff_abs:.4f}, {diff_pct:.2f}%)")
-            
-            except Exception as e:
-                print(f"    Warning: Error checking {symbol}: {e}")
-            
-            if i % 500 == 0:
-                print(f"    Processed {i}/{len(existing_symbols)} symbols...")
+        # Log every mismatch in one pass (tab-separated: symbol, prices, abs diff, % diff)
+        mismatches.to_csv(
+            log,
+            sep='\t',
+            float_format='%.4f',
+            index_label='symbol',
+            header=['db_close', 'yahoo_close', 'abs_diff', 'pct_diff'],
+            lineterminator='\n'
+        )
+        
+        # Print a sample to console; the full list is in the log file
+        for symbol, db_close, yahoo_close, diff_abs, diff_pct in mismatches.head(CONSOLE_MISMATCH_LIMIT).itertuples(name=None):
+            print(f"    {symbol}: DB=${db_close:.2f}, Yahoo=${yahoo_close:.2f} (${diff_abs:.4f}, {diff_pct:.2f}%)")
+        if len(mismatches) > CONSOLE_MISMATCH_LIMIT:
+            print(f"    ... and {len(mismatches) - CONSOLE_MISMATCH_LIMIT} more (see log)")
         
         # Write summary
         log.write(f"\n{'='*60}\n")
@@ -518,7 +971,9 @@ def daily_update_stocks(limit=None, lookback_days=5):
     # Download max data (new + corporate action tickers)
     max_download_tickers = new_tickers + max_tickers
     max_data = None
-    incremental_stats = {'new_success': 0, 'new_records': 0, 'max_success': 0, 'max_records': 0}
+    incremental_stats = {'new_success': 0, 'new_records': 0, 'new_failed': 0,
+                         'max_success': 0, 'max_records': 0, 'max_failed': 0,
+                         'failed_tickers': []}
     incremental_processing_used = False
     
     if max_download_tickers:
@@ -550,8 +1005,11 @@ def daily_update_stocks(limit=None, lookback_days=5):
                 # Accumulate stats
                 incremental_stats['new_success'] += batch_stats['new_success']
                 incremental_stats['new_records'] += batch_stats['new_records']
+                incremental_stats['new_failed'] += batch_stats['new_failed']
                 incremental_stats['max_success'] += batch_stats['max_success']
                 incremental_stats['max_records'] += batch_stats['max_records']
+                incremental_stats['max_failed'] += batch_stats['max_failed']
+                incremental_stats['failed_tickers'].extend(batch_stats['failed_tickers'])
             
             max_data = download_data_in_batches(
                 max_download_tickers,
@@ -617,7 +1075,6 @@ def daily_update_stocks(limit=None, lookback_days=5):
             log.write(f"[4/4] Updating database...\n")  # Log this step
             log.write(f"  Checking {lookback_days}-day tickers: {len(tickers_lookback) if tickers_lookback else 0} tickers\n")
             log.write(f"  data_lookback_cached is {'None' if data_lookback_cached is None else 'available'}\n")
-            log.flush()  # Flush incremental stats
         else:
             log = open(log_file, 'w', encoding='utf-8')
             log.write(f"Daily Update Started: {start_time}\n")
@@ -634,13 +1091,13 @@ def daily_update_stocks(limit=None, lookback_days=5):
         if incremental_processing_used:
             stats = {
                 'new_success': incremental_stats['new_success'],
-                'new_failed': 0,
+                'new_failed': incremental_stats['new_failed'],
                 'max_success': incremental_stats['max_success'],
-                'max_failed': 0,
+                'max_failed': incremental_stats['max_failed'],
                 'lookback_success': 0,
                 'lookback_failed': 0,
                 'total_records': incremental_stats['new_records'] + incremental_stats['max_records'],
-                'failed_tickers': []
+                'failed_tickers': list(incremental_stats['failed_tickers'])
             }
         else:
             stats = {
@@ -666,14 +1123,17 @@ def daily_update_stocks(limit=None, lookback_days=5):
             except Exception as e:
                 print(f"  ✗ Batched bulk insert failed: {e}")
                 log.write(f"  ✗ Batched bulk insert (new) failed: {e}\n")
-                # Fallback to individual processing
+                # Fallback to individual processing - one transaction for all symbols,
+                # metadata writes queued and sent in a single batch at the end
                 print(f"  Falling back to individual processing...")
+                conn.rollback()  # Release anything the failed batch left open on the main connection
+                pending_inserts = []
+                fallback_records = {}
                 for symbol in new_tickers:
                     try:
-                        success, records = insert_ticker_data(conn, symbol, max_data, log)
+                        success, records = insert_ticker_data(conn, symbol, max_data, log, pending_inserts)
                         if success:
-                            stats['new_success'] += 1
-                            stats['total_records'] += records
+                            fallback_records[symbol] = records
                         else:
                             stats['new_failed'] += 1
                             stats['failed_tickers'].append((symbol, 'new', 'No data available'))
@@ -681,6 +1141,17 @@ def daily_update_stocks(limit=None, lookback_days=5):
                         stats['new_failed'] += 1
                         stats['failed_tickers'].append((symbol, 'new', str(e2)))
                         log.write(f"  ✗ {symbol} (new): {e2}\n")
+                try:
+                    flush_new_ticker_rows(conn, pending_inserts)
+                    conn.commit()
+                    stats['new_success'] += len(fallback_records)
+                    stats['total_records'] += sum(fallback_records.values())
+                except Exception as e2:
+                    conn.rollback()
+                    log.write(f"  ✗ Fallback commit (new) failed: {e2}\n")
+                    stats['new_failed'] += len(fallback_records)
+                    for symbol in fallback_records:
+                        stats['failed_tickers'].append((symbol, 'new', str(e2)))
         
         # Process max tickers (BATCHED BULK DELETE + INSERT)
         # Skip if already processed incrementally
@@ -694,14 +1165,17 @@ def daily_update_stocks(limit=None, lookback_days=5):
             except Exception as e:
                 print(f"  ✗ Batched bulk delete+insert failed: {e}")
                 log.write(f"  ✗ Batched bulk delete+insert (max) failed: {e}\n")
-                # Fallback to individual processing
+                # Fallback to individual processing - one transaction for all symbols,
+                # metadata writes queued and sent in a single batch at the end
                 print(f"  Falling back to individual processing...")
+                conn.rollback()  # Release anything the failed batch left open on the main connection
+                pending_updates = []
+                fallback_records = {}
                 for symbol in max_tickers:
                     try:
-                        success, records = delete_and_insert_ticker_data(conn, symbol, max_data, log)
+                        success, records = delete_and_insert_ticker_data(conn, symbol, max_data, log, pending_updates)
                         if success:
-                            stats['max_success'] += 1
-                            stats['total_records'] += records
+                            fallback_records[symbol] = records
                         else:
                             stats['max_failed'] += 1
                             stats['failed_tickers'].append((symbol, 'max', 'No data available'))
@@ -709,44 +1183,58 @@ def daily_update_stocks(limit=None, lookback_days=5):
                         stats['max_failed'] += 1
                         stats['failed_tickers'].append((symbol, 'max', str(e2)))
                         log.write(f"  ✗ {symbol} (max): {e2}\n")
+                try:
+                    flush_ticker_updates(conn, pending_updates, MAX_TICKER_UPDATE_SQL)
+                    conn.commit()
+                    stats['max_success'] += len(fallback_records)
+                    stats['total_records'] += sum(fallback_records.values())
+                except Exception as e2:
+                    conn.rollback()
+                    log.write(f"  ✗ Fallback commit (max) failed: {e2}\n")
+                    stats['max_failed'] += len(fallback_records)
+                    for symbol in fallback_records:
+                        stats['failed_tickers'].append((symbol, 'max', str(e2)))
         
         # Process lookback-day tickers (BATCHED BULK UPSERT) - use cached data
         log.write(f"\n--- Starting {lookback_days}-day ticker processing ---\n")
         log.write(f"  tickers_lookback count: {len(tickers_lookback) if tickers_lookback else 0}\n")
         log.write(f"  data_lookback_cached is None: {data_lookback_cached is None}\n")
-        log.flush()
         
         if tickers_lookback:
             if data_lookback_cached is not None:
                 print(f"\n  Processing {len(tickers_lookback)} tickers ({lookback_days}-day BATCHED BULK UPSERT)...")
                 log.write(f"\nProcessing {len(tickers_lookback)} tickers ({lookback_days}-day BATCHED BULK UPSERT)...\n")
-                log.flush()
                 try:
                     success_count, total_records = batched_bulk_upsert_ticker_data(conn, tickers_lookback, data_lookback_cached, log, batch_size=500)
                     stats['lookback_success'] = success_count
                     stats['total_records'] += total_records
                     print(f"  ✓ Successfully processed {success_count} tickers with {total_records:,} records")
                     log.write(f"  ✓ Successfully processed {success_count} tickers with {total_records:,} records\n")
-                    log.flush()
                 except Exception as e:
                     print(f"  ✗ Batched bulk upsert failed: {e}")
                     log.write(f"  ✗ Batched bulk upsert ({lookback_days}d) failed: {e}\n")
-                    log.flush()
-                    # Fallback to individual processing
-                    print(f"  Falling back to individual processing...")
-                    for symbol in tickers_lookback:
-                        try:
-                            success, records = upsert_ticker_data(conn, symbol, data_lookback_cached, log)
-                            if success:
-                                stats['lookback_success'] += 1
-                                stats['total_records'] += records
-                            else:
-                                stats['lookback_failed'] += 1
-                                stats['failed_tickers'].append((symbol, f'{lookback_days}d', 'No data available'))
-                        except Exception as e2:
-                            stats['lookback_failed'] += 1
-                            stats['failed_tickers'].append((symbol, f'{lookback_days}d', str(e2)))
-                            log.write(f"  ✗ {symbol} ({lookback_days}d): {e2}\n")
+                    # Fallback to individual processing - symbols are split across pooled
+                    # connections, each chunk in one transaction with batched metadata updates
+                    print(f"  Falling back to individual processing ({LOOKBACK_FALLBACK_WORKERS} workers)...")
+                    conn.rollback()  # Release anything the failed batch left open on the main connection
+                    chunk_size = (len(tickers_lookback) + LOOKBACK_FALLBACK_WORKERS - 1) // LOOKBACK_FALLBACK_WORKERS
+                    chunks = [tickers_lookback[j:j + chunk_size] for j in range(0, len(tickers_lookback), chunk_size)]
+                    db_pool = get_db_pool(max_conn=len(chunks), statement_timeout_seconds=600)
+                    try:
+                        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                            futures = [
+                                executor.submit(upsert_lookback_chunk, db_pool, chunk, data_lookback_cached, lookback_days)
+                                for chunk in chunks
+                            ]
+                            for future in as_completed(futures):
+                                fallback_records, failures, chunk_log = future.result()
+                                log.write(chunk_log)
+                                stats['lookback_success'] += len(fallback_records)
+                                stats['total_records'] += sum(fallback_records.values())
+                                stats['lookback_failed'] += len(failures)
+                                stats['failed_tickers'].extend(failures)
+                    finally:
+                        db_pool.closeall()
             else:
                 # data_lookback_cached is None - log this issue
                 print(f"\n  ⚠ Warning: {len(tickers_lookback)} tickers need {lookback_days}-day update but data_lookback_cached is None")
@@ -754,17 +1242,14 @@ def daily_update_stocks(limit=None, lookback_days=5):
                 log.write(f"\n⚠ Warning: {len(tickers_lookback)} tickers need {lookback_days}-day update but data_lookback_cached is None\n")
                 log.write(f"  Skipping {lookback_days}-day ticker processing\n")
                 log.write(f"  This means data_lookback_cached was not set during categorization step\n")
-                log.flush()
                 stats['lookback_failed'] = len(tickers_lookback)
                 for symbol in tickers_lookback:
                     stats['failed_tickers'].append((symbol, f'{lookback_days}d', 'data_lookback_cached is None'))
         else:
             log.write(f"  No {lookback_days}-day tickers to process (tickers_lookback is empty or None)\n")
-            log.flush()
         
         # Final summary - always write this even if there were errors
         log.write(f"\n--- Preparing final summary ---\n")
-        log.flush()
         try:
             end_time = datetime.now()
             elapsed = (end_time - start_time).total_seconds()
@@ -772,6 +1257,7 @@ def daily_update_stocks(limit=None, lookback_days=5):
             total_success = stats['new_success'] + stats['max_success'] + stats['lookback_success']
             total_failed = stats['new_failed'] + stats['max_failed'] + stats['lookback_failed']
             total_processed = total_success + total_failed
+            success_pct = (total_success / total_processed * 100) if total_processed else 0.0
             
             summary = f"""
 {'='*70}
@@ -796,7 +1282,7 @@ Regular update tickers ({lookback_days}-day):
 
 Total:
   Processed: {total_processed}
-  Success: {total_success} ({total_success/total_processed*100:.1f}% if total_processed > 0 else 0)
+  Success: {total_success} ({success_pct:.1f}%)
   Failed: {total_failed}
   Total records inserted/updated: {stats['total_records']:,}
 {'='*70}
@@ -820,7 +1306,6 @@ Total:
             log.write("="*70 + "\n")
             for symbol, category, error in stats['failed_tickers']:
                 log.write(f"{symbol} ({category}): {error}\n")
-            log.flush()
             
             # Save to file for retry
             failed_tickers_file = os.path.join(logs_dir, 'daily_update_failed.txt')
@@ -830,7 +1315,6 @@ Total:
             print(f"\n✓ Failed tickers saved to '{failed_tickers_file}'")
         
         print(f"✓ Log saved to '{log_file}'")
-        log.flush()  # Final flush before closing
     
     except Exception as e:
         # Catch any unhandled exceptions in the database update section
@@ -867,144 +1351,52 @@ def batched_bulk_insert_new_tickers(conn, new_tickers, max_data, log, batch_size
     total_success = 0
     total_records = 0
     
-    # Process in batches
-    for i in range(0, len(new_tickers), batch_size):
-        batch = new_tickers[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(new_tickers) + batch_size - 1) // batch_size
-        
-        print(f"  Batch {batch_num}/{total_batches}: Processing {len(batch)} tickers...")
+    # Process in batches with one cursor and one transaction; each batch gets a
+    # savepoint so a failed batch is undone without losing the others
+    with conn.cursor() as cursor:
+        for i in range(0, len(new_tickers), batch_size):
+            batch = new_tickers[i:i + batch_size]
+            batch_num = (i // batch_size) + 1
+            total_batches = (len(new_tickers) + batch_size - 1) // batch_size
         
-        all_values = []
-        ticker_metadata = {}  # {symbol: (first_date, last_date, record_count, asset_type, country)}
+            print(f"  Batch {batch_num}/{total_batches}: Processing {len(batch)} tickers...")
         
-        # Collect data for this batch
-        for symbol in batch:
-            try:
-                if len(max_data.columns.levels[0]) > 1 if hasattr(max_data.columns, 'levels') else False:
-                    if symbol not in max_data.columns.levels[0]:
-                        continue
-                    df = max_data[symbol]
-                else:
-                    df = max_data
-                
-                if df.empty or df.dropna().empty:
-                    continue
-                
-                symbol_values = []
-                max_price_limit = 10**12
-                
-                # Convert to list of tuples with dates for sorting
-                date_price_list = []
-                for date, row in df.iterrows():
-                    if pd.notna(row['Open']) and pd.notna(row['Close']):
-                        open_price = float(row['Open'])
-                        high_price = float(row['High'])
-                        low_price = float(row['Low'])
-                        close_price = float(row['Close'])
-                        
-                        date_price_list.append((
-                            date,
-                            open_price, high_price, low_price, close_price,
-                            int(row['Volume'])
-                        ))
-                
-                if not date_price_list:
-                    continue
-                
-                # Sort by date descending (most recent first)
-                date_price_list.sort(key=lambda x: x[0], reverse=True)
-                
-                # Find cutoff date: first date (going back from current) where price > 10^12
-                cutoff_date = None
-                for date, open_price, high_price, low_price, close_price, volume in date_price_list:
-                    if (abs(open_price) >= max_price_limit or 
-                        abs(high_price) >= max_price_limit or 
-                        abs(low_price) >= max_price_limit or 
-                        abs(close_price) >= max_price_limit):
-                        cutoff_date = date
-                        break
-                
-                # Filter: keep only dates > cutoff_date (if cutoff found, else keep all)
-                if cutoff_date is not None:
-                    # Keep dates after cutoff_date (excluding the problematic cutoff_date itself)
-                    filtered_dates = [x for x in date_price_list if x[0] > cutoff_date]
-                    if not filtered_dates:
-                        log.write(f"  ✗ {symbol} (new): Skipped - all dates have prices > 10^12\n")
-                        continue
-                else:
-                    # No problematic dates found, keep all
-                    filtered_dates = date_price_list
-                
-                # Convert to symbol_values format
-                for date, open_price, high_price, low_price, close_price, volume in filtered_dates:
-                    dt = normalize_timestamp(date)
-                    symbol_values.append((
-                        dt, symbol,
-                        open_price, high_price, low_price,
-                        close_price, volume
-                    ))
-                
-                if symbol_values:
-                    all_values.extend(symbol_values)
-                    first_date = min(v[0] for v in symbol_values)
-                    last_date = max(v[0] for v in symbol_values)
-                    asset_type, country = get_ticker_metadata(symbol)
-                    ticker_metadata[symbol] = (first_date, last_date, len(symbol_values), asset_type, country)
-            
-            except Exception as e:
-                log.write(f"  ✗ {symbol} (new): Error collecting data: {e}\n")
+            # Collect data for this batch
+            # ticker_metadata: {symbol: (first_date, last_date, record_count, asset_type, country)}
+            all_values, ticker_metadata = collect_batch_values(max_data, batch, log, 'new', fetch_metadata=True)
         
-        if not all_values:
-            print(f"    ⚠ Batch {batch_num}: No data to insert")
-            continue
+            if not all_values:
+                print(f"    ⚠ Batch {batch_num}: No data to insert")
+                continue
         
-        # Process this batch
-        cursor = conn.cursor()
-        try:
-            # Bulk insert price data
-            execute_values(
-                cursor,
-                """
-                INSERT INTO yahoo_adjusted_stock_prices 
-                (timestamp, symbol, open, high, low, close, volume)
-                VALUES %s
-                ON CONFLICT (symbol, timestamp) DO NOTHING
-                """,
-                all_values,
-                page_size=10000
-            )
+            try:
+                cursor.execute("SAVEPOINT batch")
+                # Bulk load price data (COPY via staging table, skipping existing rows)
+                copy_new_ticker_prices(cursor, all_values)
             
-            # Bulk insert tickers metadata
-            ticker_records = [
-                (symbol, asset_type, country, first_date, last_date, record_count, datetime.now())
-                for symbol, (first_date, last_date, record_count, asset_type, country) in ticker_metadata.items()
-            ]
+                # Bulk insert tickers metadata
+                ticker_records = [
+                    (symbol, asset_type, country, first_date, last_date, record_count)
+                    for symbol, (first_date, last_date, record_count, asset_type, country) in ticker_metadata.items()
+                ]
             
-            execute_values(
-                cursor,
-                """
-                INSERT INTO tickers (symbol, asset_type, country, first_date, last_date, record_count, last_updated)
-                VALUES %s
-                ON CONFLICT (symbol) DO NOTHING
-                """,
-                ticker_records,
-                page_size=1000
-            )
+                execute_values(cursor, NEW_TICKER_INSERT_SQL, ticker_records,
+                               template=NEW_TICKER_ROW_TEMPLATE, page_size=1000)
             
-            conn.commit()
-            cursor.close()
+                cursor.execute("RELEASE SAVEPOINT batch")
             
-            total_success += len(ticker_metadata)
-            total_records += len(all_values)
-            print(f"    ✓ Batch {batch_num}: {len(ticker_metadata)} tickers, {len(all_values):,} records")
+                total_success += len(ticker_metadata)
+                total_records += len(all_values)
+                print(f"    ✓ Batch {batch_num}: {len(ticker_metadata)} tickers, {len(all_values):,} records")
         
-        except Exception as e:
-            conn.rollback()
-            cursor.close()
-            print(f"    ✗ Batch {batch_num} failed: {e}")
-            log.write(f"  ✗ Batch {batch_num} (new) failed: {e}\n")
-            # Continue with next batch
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT batch")
+                print(f"    ✗ Batch {batch_num} failed: {e}")
+                log.write(f"  ✗ Batch {batch_num} (new) failed: {e}\n")
+                # Continue with next batch
+    
+    # One commit (one WAL flush) for the whole phase
+    conn.commit()
     
     print(f"  ✓ Completed: {total_success} tickers, {total_records:,} total records")
     return total_success, total_records
@@ -1016,140 +1408,53 @@ def batched_bulk_delete_and_insert_max_tickers(conn, max_tickers, max_data, log,
     total_success = 0
     total_records = 0
     
-    # Process in batches
-    for i in range(0, len(max_tickers), batch_size):
-        batch = max_tickers[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(max_tickers) + batch_size - 1) // batch_size
-        
-        print(f"  Batch {batch_num}/{total_batches}: Processing {len(batch)} tickers...")
+    # Process in batches with one cursor and one transaction; each batch gets a
+    # savepoint so a failed batch is undone without losing the others
+    with conn.cursor() as cursor:
+        for i in range(0, len(max_tickers), batch_size):
+            batch = max_tickers[i:i + batch_size]
+            batch_num = (i // batch_size) + 1
+            total_batches = (len(max_tickers) + batch_size - 1) // batch_size
         
-        all_values = []
-        ticker_metadata = {}  # {symbol: (first_date, last_date, record_count)}
+            print(f"  Batch {batch_num}/{total_batches}: Processing {len(batch)} tickers...")
         
-        # Collect data for this batch
-        for symbol in batch:
-            try:
-                if len(max_data.columns.levels[0]) > 1 if hasattr(max_data.columns, 'levels') else False:
-                    if symbol not in max_data.columns.levels[0]:
-                        continue
-                    df = max_data[symbol]
-                else:
-                    df = max_data
-                
-                if df.empty or df.dropna().empty:
-                    continue
-                
-                symbol_values = []
-                max_price_limit = 10**12
-                
-                # Convert to list of tuples with dates for sorting
-                date_price_list = []
-                for date, row in df.iterrows():
-                    if pd.notna(row['Open']) and pd.notna(row['Close']):
-                        open_price = float(row['Open'])
-                        high_price = float(row['High'])
-                        low_price = float(row['Low'])
-                        close_price = float(row['Close'])
-                        
-                        date_price_list.append((
-                            date,
-                            open_price, high_price, low_price, close_price,
-                            int(row['Volume'])
-                        ))
-                
-                if not date_price_list:
-                    continue
-                
-                # Sort by date descending (most recent first)
-                date_price_list.sort(key=lambda x: x[0], reverse=True)
-                
-                # Find cutoff date: first date (going back from current) where price > 10^12
-                cutoff_date = None
-                for date, open_price, high_price, low_price, close_price, volume in date_price_list:
-                    if (abs(open_price) >= max_price_limit or 
-                        abs(high_price) >= max_price_limit or 
-                        abs(low_price) >= max_price_limit or 
-                        abs(close_price) >= max_price_limit):
-                        cutoff_date = date
-                        break
-                
-                # Filter: keep only dates > cutoff_date (if cutoff found, else keep all)
-                if cutoff_date is not None:
-                    # Keep dates after cutoff_date (excluding the problematic cutoff_date itself)
-                    filtered_dates = [x for x in date_price_list if x[0] > cutoff_date]
-                    if not filtered_dates:
-                        log.write(f"  ✗ {symbol} (max): Skipped - all dates have prices > 10^12\n")
-                        continue
-                else:
-                    # No problematic dates found, keep all
-                    filtered_dates = date_price_list
-                
-                # Convert to symbol_values format
-                for date, open_price, high_price, low_price, close_price, volume in filtered_dates:
-                    dt = normalize_timestamp(date)
-                    symbol_values.append((
-                        dt, symbol,
-                        open_price, high_price, low_price,
-                        close_price, volume
-                    ))
-                
-                if symbol_values:
-                    all_values.extend(symbol_values)
-                    first_date = min(v[0] for v in symbol_values)
-                    last_date = max(v[0] for v in symbol_values)
-                    ticker_metadata[symbol] = (first_date, last_date, len(symbol_values))
-            
-            except Exception as e:
-                log.write(f"  ✗ {symbol} (max): Error collecting data: {e}\n")
+            # Collect data for this batch
+            # ticker_metadata: {symbol: (first_date, last_date, record_count)}
+            all_values, ticker_metadata = collect_batch_values(max_data, batch, log, 'max')
         
-        if not all_values:
-            print(f"    ⚠ Batch {batch_num}: No data to insert")
-            continue
+            if not all_values:
+                print(f"    ⚠ Batch {batch_num}: No data to insert")
+                continue
         
-        # Process this batch
-        cursor = conn.cursor()
-        try:
-            # Delete for this batch
-            cursor.execute("""
-                DELETE FROM yahoo_adjusted_stock_prices 
-                WHERE symbol = ANY(%s)
-            """, (batch,))
-            deleted = cursor.rowcount
+            try:
+                cursor.execute("SAVEPOINT batch")
+                # Delete for this batch
+                cursor.execute("""
+                    DELETE FROM yahoo_adjusted_stock_prices 
+                    WHERE symbol = ANY(%s)
+                """, (batch,))
+                deleted = cursor.rowcount
             
-            # Bulk insert this batch
-            execute_values(
-                cursor,
-                """
-                INSERT INTO yahoo_adjusted_stock_prices 
-                (timestamp, symbol, open, high, low, close, volume)
-                VALUES %s
-                """,
-                all_values,
-                page_size=10000
-            )
+                # Bulk load this batch (rows were just deleted, so no conflicts are possible)
+                bulk_copy_ohlcv(cursor, all_values)
             
-            # Update tickers metadata for this batch
-            for symbol, (first_date, last_date, record_count) in ticker_metadata.items():
-                cursor.execute("""
-                    UPDATE tickers 
-                    SET first_date = %s, last_date = %s, record_count = %s, last_updated = NOW()
-                    WHERE symbol = %s
-                """, (first_date, last_date, record_count, symbol))
+                # Update tickers metadata for this batch in one statement
+                update_max_ticker_metadata(cursor, ticker_metadata)
             
-            conn.commit()
-            cursor.close()
+                cursor.execute("RELEASE SAVEPOINT batch")
             
-            total_success += len(ticker_metadata)
-            total_records += len(all_values)
-            print(f"    ✓ Batch {batch_num}: {len(ticker_metadata)} tickers, {len(all_values):,} records (deleted {deleted} old records)")
+                total_success += len(ticker_metadata)
+                total_records += len(all_values)
+                print(f"    ✓ Batch {batch_num}: {len(ticker_metadata)} tickers, {len(all_values):,} records (deleted {deleted} old records)")
         
-        except Exception as e:
-            conn.rollback()
-            cursor.close()
-            print(f"    ✗ Batch {batch_num} failed: {e}")
-            log.write(f"  ✗ Batch {batch_num} (max) failed: {e}\n")
-            # Continue with next batch
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT batch")
+                print(f"    ✗ Batch {batch_num} failed: {e}")
+                log.write(f"  ✗ Batch {batch_num} (max) failed: {e}\n")
+                # Continue with next batch
+    
+    # One commit (one WAL flush) for the whole phase
+    conn.commit()
     
     print(f"  ✓ Completed: {total_success} tickers, {total_records:,} total records")
     return total_success, total_records
@@ -1161,140 +1466,122 @@ def batched_bulk_upsert_ticker_data(conn, tickers_lookback, data_lookback_cached
     total_success = 0
     total_records = 0
     
-    # Process in batches
-    for i in range(0, len(tickers_lookback), batch_size):
-        batch = tickers_lookback[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(tickers_lookback) + batch_size - 1) // batch_size
-        
-        print(f"  Batch {batch_num}/{total_batches}: Processing {len(batch)} tickers...")
+    # Process in batches with one cursor and one transaction; each batch gets a
+    # savepoint so a failed batch is undone without losing the others
+    with conn.cursor() as cursor:
+        for i in range(0, len(tickers_lookback), batch_size):
+            batch = tickers_lookback[i:i + batch_size]
+            batch_num = (i // batch_size) + 1
+            total_batches = (len(tickers_lookback) + batch_size - 1) // batch_size
         
-        all_values = []
-        ticker_metadata = {}  # {symbol: last_date}
+            print(f"  Batch {batch_num}/{total_batches}: Processing {len(batch)} tickers...")
         
-        # Collect data for this batch
-        for symbol in batch:
+            # Collect data for this batch (vectorized across all its symbols)
             try:
-                if len(data_lookback_cached.columns.levels[0]) > 1 if hasattr(data_lookback_cached.columns, 'levels') else False:
-                    if symbol not in data_lookback_cached.columns.levels[0]:
-                        continue
-                    df = data_lookback_cached[symbol]
-                else:
-                    df = data_lookback_cached
-                
-                if df.empty or df.dropna().empty:
-                    continue
-                
-                symbol_values = []
-                for date, row in df.iterrows():
-                    if pd.notna(row['Open']) and pd.notna(row['Close']):
-                        dt = date.to_pydatetime()
-                        symbol_values.append((
-                            dt, symbol,
-                            float(row['Open']), float(row['High']), float(row['Low']),
-                            float(row['Close']), int(row['Volume'])
-                        ))
-                
-                if symbol_values:
-                    all_values.extend(symbol_values)
-                    last_date = max(v[0] for v in symbol_values)
-                    ticker_metadata[symbol] = last_date
-            
+                all_values, ticker_metadata = build_batch_ohlcv_values(data_lookback_cached, batch)
             except Exception as e:
-                log.write(f"  ✗ {symbol} (lookback): Error collecting data: {e}\n")
+                log.write(f"  ✗ Batch {batch_num} (lookback): Error collecting data: {e}\n")
+                continue
         
-        if not all_values:
-            print(f"    ⚠ Batch {batch_num}: No data to insert")
-            continue
+            if not all_values:
+                print(f"    ⚠ Batch {batch_num}: No data to insert")
+                continue
         
-        # Process this batch
-        cursor = conn.cursor()
-        try:
-            # Bulk upsert price data
-            execute_values(
-                cursor,
-                """
-                INSERT INTO yahoo_adjusted_stock_prices 
-                (timestamp, symbol, open, high, low, close, volume)
-                VALUES %s
-                ON CONFLICT (symbol, timestamp) 
-                DO UPDATE SET 
-                    open = EXCLUDED.open,
-                    high = EXCLUDED.high,
-                    low = EXCLUDED.low,
-                    close = EXCLUDED.close,
-                    volume = EXCLUDED.volume
-                """,
-                all_values,
-                page_size=10000
-            )
+            try:
+                cursor.execute("SAVEPOINT batch")
+                # Bulk upsert price data; unchanged rows are skipped server-side, and
+                # xmax = 0 marks rows that were inserted rather than updated
+                upserted = execute_values(
+                    cursor,
+                    """
+                    INSERT INTO yahoo_adjusted_stock_prices 
+                    (timestamp, symbol, open, high, low, close, volume)
+                    VALUES %s
+                    ON CONFLICT (symbol, timestamp) 
+                    DO UPDATE SET 
+                        open = EXCLUDED.open,
+                        high = EXCLUDED.high,
+                        low = EXCLUDED.low,
+                        close = EXCLUDED.close,
+                        volume = EXCLUDED.volume
+                    WHERE (yahoo_adjusted_stock_prices.open, yahoo_adjusted_stock_prices.high,
+                           yahoo_adjusted_stock_prices.low, yahoo_adjusted_stock_prices.close,
+                           yahoo_adjusted_stock_prices.volume)
+                        IS DISTINCT FROM
+                          (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume)
+                    RETURNING symbol, (xmax = 0) AS inserted
+                    """,
+                    all_values,
+                    template=OHLCV_ROW_TEMPLATE,
+                    page_size=1000,
+                    fetch=True
+                )
+                inserted_counts = Counter(symbol for symbol, inserted in upserted if inserted)
             
-            # Update tickers metadata for this batch
-            for symbol, last_date in ticker_metadata.items():
-                cursor.execute("""
-                    UPDATE tickers 
-                    SET last_date = %s,
-                        record_count = (
-                            SELECT COUNT(*) 
-                            FROM yahoo_adjusted_stock_prices 
-                            WHERE symbol = %s
-                        ),
+                # Update tickers metadata for the whole batch in one statement; record_count
+                # grows by the newly inserted rows instead of re-counting the price table
+                execute_values(
+                    cursor,
+                    """
+                    UPDATE tickers AS t
+                    SET last_date = v.last_date,
+                        record_count = COALESCE(t.record_count, 0) + v.inserted,
                         last_updated = NOW()
-                    WHERE symbol = %s
-                """, (last_date, symbol, symbol))
+                    FROM (VALUES %s) AS v(symbol, last_date, inserted)
+                    WHERE t.symbol = v.symbol
+                    """,
+                    [(symbol, last_date, inserted_counts.get(symbol, 0))
+                     for symbol, last_date in ticker_metadata.items()],
+                    template="(%s, %s, %s)",
+                    page_size=1000
+                )
             
-            conn.commit()
-            cursor.close()
+                cursor.execute("RELEASE SAVEPOINT batch")
             
-            total_success += len(ticker_metadata)
-            total_records += len(all_values)
-            print(f"    ✓ Batch {batch_num}: {len(ticker_metadata)} tickers, {len(all_values):,} records")
+                total_success += len(ticker_metadata)
+                total_records += len(all_values)
+                print(f"    ✓ Batch {batch_num}: {len(ticker_metadata)} tickers, {len(all_values):,} records")
         
-        except Exception as e:
-            conn.rollback()
-            cursor.close()
-            print(f"    ✗ Batch {batch_num} failed: {e}")
-            log.write(f"  ✗ Batch {batch_num} (lookback) failed: {e}\n")
-            # Continue with next batch
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT batch")
+                print(f"    ✗ Batch {batch_num} failed: {e}")
+                log.write(f"  ✗ Batch {batch_num} (lookback) failed: {e}\n")
+                # Continue with next batch
+    
+    # One commit (one WAL flush) for the whole phase
+    conn.commit()
     
     print(f"  ✓ Completed: {total_success} tickers, {total_records:,} total records")
     return total_success, total_records
 
-def insert_ticker_data(conn, symbol, data, log):
-    """Insert data for a new ticker (INSERT only)"""
+def insert_ticker_data(conn, symbol, data, log, pending_inserts=None):
+    """Insert data for a new ticker (INSERT only)
+    
+    Args:
+        pending_inserts: Optional list. When given, the price insert runs inside a
+                         savepoint, the tickers row is appended to this list instead of
+                         inserted, and nothing is committed. The caller sends them all
+                         with flush_new_ticker_rows() and commits once.
+    """
+    savepoint = False
     try:
-        # Handle both single ticker and multi-ticker downloads
-        if len(data.columns.levels[0]) > 1 if hasattr(data.columns, 'levels') else False:
-            # Multi-ticker download
-            if symbol not in data.columns.levels[0]:
-                return (False, 0)
-            df = data[symbol]
-        else:
-            # Single ticker download
-            df = data
-        
-        if df.empty or df.dropna().empty:
+        df = get_symbol_frame(data, symbol)
+        if df is None or df.empty or not df['Close'].notna().any():
             return (False, 0)
         
         # Prepare values for bulk insert
-        values = []
-        for date, row in df.iterrows():
-            if pd.notna(row['Open']) and pd.notna(row['Close']):
-                values.append((
-                    normalize_timestamp(date),
-                    symbol,
-                    float(row['Open']),
-                    float(row['High']),
-                    float(row['Low']),
-                    float(row['Close']),
-                    int(row['Volume'])
-                ))
+        values = build_ohlcv_values(symbol, df)
         
         if not values:
             return (False, 0)
         
         cursor = conn.cursor()
         
+        if pending_inserts is not None:
+            # Isolate this symbol so a failure doesn't abort the caller's transaction
+            cursor.execute("SAVEPOINT insert_ticker")
+            savepoint = True
+        
         # Insert price data
         execute_values(
             cursor,
@@ -1305,24 +1592,25 @@ def insert_ticker_data(conn, symbol, data, log):
             ON CONFLICT (symbol, timestamp) DO NOTHING
             """,
             values,
-            page_size=5000
+            template=OHLCV_ROW_TEMPLATE,
+            page_size=FALLBACK_PAGE_SIZE
         )
         
         # Get dates for tickers table
-        first_date = min(v[0] for v in values)
-        last_date = max(v[0] for v in values)
+        first_date = values[0][0]
+        last_date = values[-1][0]
         
         # Get metadata
         asset_type, country = get_ticker_metadata(symbol)
         
         # Insert into tickers table
-        cursor.execute("""
-            INSERT INTO tickers (symbol, asset_type, country, first_date, last_date, record_count, last_updated)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
-            ON CONFLICT (symbol) DO NOTHING
-        """, (symbol, asset_type, country, first_date, last_date, len(values)))
-        
-        conn.commit()
+        ticker_row = (symbol, asset_type, country, first_date, last_date, len(values))
+        if pending_inserts is not None:
+            cursor.execute("RELEASE SAVEPOINT insert_ticker")
+            pending_inserts.append(ticker_row)
+        else:
+            execute_values(cursor, NEW_TICKER_INSERT_SQL, [ticker_row], template=NEW_TICKER_ROW_TEMPLATE)
+            conn.commit()
         cursor.close()
         
         log.write(f" {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: ✓ {symbol} (new): {len(values)} records\n")
@@ -1330,44 +1618,38 @@ def insert_ticker_data(conn, symbol, data, log):
         return (True, len(values))
         
     except Exception as e:
-        conn.rollback()
+        rollback_pending(conn, pending_inserts, savepoint, 'insert_ticker')
         raise e
 
-def delete_and_insert_ticker_data(conn, symbol, data, log):
-    """Delete existing data and insert fresh data for ticker with corporate actions"""
+def delete_and_insert_ticker_data(conn, symbol, data, log, pending_updates=None):
+    """Delete existing data and insert fresh data for ticker with corporate actions
+    
+    Args:
+        pending_updates: Optional list. When given, the delete + insert runs inside a
+                         savepoint, the tickers UPDATE parameters are appended to this
+                         list instead of executed, and nothing is committed. The caller
+                         sends them all with flush_ticker_updates(..., MAX_TICKER_UPDATE_SQL)
+                         and commits once.
+    """
+    savepoint = False
     try:
-        # Handle both single ticker and multi-ticker downloads
-        if len(data.columns.levels[0]) > 1 if hasattr(data.columns, 'levels') else False:
-            # Multi-ticker download
-            if symbol not in data.columns.levels[0]:
-                return (False, 0)
-            df = data[symbol]
-        else:
-            # Single ticker download
-            df = data
-        
-        if df.empty or df.dropna().empty:
+        df = get_symbol_frame(data, symbol)
+        if df is None or df.empty or not df['Close'].notna().any():
             return (False, 0)
         
         # Prepare values for bulk insert
-        values = []
-        for date, row in df.iterrows():
-            if pd.notna(row['Open']) and pd.notna(row['Close']):
-                values.append((
-                    normalize_timestamp(date),
-                    symbol,
-                    float(row['Open']),
-                    float(row['High']),
-                    float(row['Low']),
-                    float(row['Close']),
-                    int(row['Volume'])
-                ))
+        values = build_ohlcv_values(symbol, df)
         
         if not values:
             return (False, 0)
         
         cursor = conn.cursor()
         
+        if pending_updates is not None:
+            # Isolate this symbol so a failure doesn't abort the caller's transaction
+            cursor.execute("SAVEPOINT delete_and_insert_ticker")
+            savepoint = True
+        
         # Delete existing price data
         cursor.execute("DELETE FROM yahoo_adjusted_stock_prices WHERE symbol = %s", (symbol,))
         
@@ -1380,23 +1662,21 @@ def delete_and_insert_ticker_data(conn, symbol, data, log):
             VALUES %s
             """,
             values,
-            page_size=5000
+            template=OHLCV_ROW_TEMPLATE,
+            page_size=FALLBACK_PAGE_SIZE
         )
         
         # Update tickers table with new dates/counts
-        first_date = min(v[0] for v in values)
-        last_date = max(v[0] for v in values)
-        
-        cursor.execute("""
-            UPDATE tickers 
-            SET first_date = %s,
-                last_date = %s,
-                record_count = %s,
-                last_updated = NOW()
-            WHERE symbol = %s
-        """, (first_date, last_date, len(values), symbol))
-        
-        conn.commit()
+        first_date = values[0][0]
+        last_date = values[-1][0]
+        
+        ticker_update = (first_date, last_date, len(values), symbol)
+        if pending_updates is not None:
+            cursor.execute("RELEASE SAVEPOINT delete_and_insert_ticker")
+            pending_updates.append(ticker_update)
+        else:
+            cursor.execute(MAX_TICKER_UPDATE_SQL, ticker_update)
+            conn.commit()
         cursor.close()
         
         log.write(f" {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: ✓ {symbol} (max): {len(values)} records\n")
@@ -1404,44 +1684,37 @@ def delete_and_insert_ticker_data(conn, symbol, data, log):
         return (True, len(values))
         
     except Exception as e:
-        conn.rollback()
+        rollback_pending(conn, pending_updates, savepoint, 'delete_and_insert_ticker')
         raise e
 
-def upsert_ticker_data(conn, symbol, data, log):
-    """Upsert lookback-day data for ticker without corporate actions"""
+def upsert_ticker_data(conn, symbol, data, log, pending_updates=None):
+    """Upsert lookback-day data for ticker without corporate actions
+    
+    Args:
+        pending_updates: Optional list. When given, the price upsert runs inside a
+                         savepoint, the symbol is appended to this list instead of
+                         updating tickers, and nothing is committed. The caller refreshes
+                         them all with refresh_ticker_stats() and commits once.
+    """
+    savepoint = False
     try:
-        # Handle both single ticker and multi-ticker downloads
-        if len(data.columns.levels[0]) > 1 if hasattr(data.columns, 'levels') else False:
-            # Multi-ticker download
-            if symbol not in data.columns.levels[0]:
-                return (False, 0)
-            df = data[symbol]
-        else:
-            # Single ticker download
-            df = data
-        
-        if df.empty or df.dropna().empty:
+        df = get_symbol_frame(data, symbol)
+        if df is None or df.empty or not df['Close'].notna().any():
             return (False, 0)
         
         # Prepare values for bulk upsert
-        values = []
-        for date, row in df.iterrows():
-            if pd.notna(row['Open']) and pd.notna(row['Close']):
-                values.append((
-                    date.to_pydatetime(),
-                    symbol,
-                    float(row['Open']),
-                    float(row['High']),
-                    float(row['Low']),
-                    float(row['Close']),
-                    int(row['Volume'])
-                ))
+        values = build_ohlcv_values(symbol, df)
         
         if not values:
             return (False, 0)
         
         cursor = conn.cursor()
         
+        if pending_updates is not None:
+            # Isolate this symbol so a failure doesn't abort the caller's transaction
+            cursor.execute("SAVEPOINT upsert_ticker")
+            savepoint = True
+        
         # Upsert price data
         execute_values(
             cursor,
@@ -1456,27 +1729,24 @@ def upsert_ticker_data(conn, symbol, data, log):
                 low = EXCLUDED.low,
                 close = EXCLUDED.close,
                 volume = EXCLUDED.volume
+            WHERE (yahoo_adjusted_stock_prices.open, yahoo_adjusted_stock_prices.high,
+                   yahoo_adjusted_stock_prices.low, yahoo_adjusted_stock_prices.close,
+                   yahoo_adjusted_stock_prices.volume)
+                IS DISTINCT FROM
+                  (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume)
             """,
             values,
-            page_size=5000
+            template=OHLCV_ROW_TEMPLATE,
+            page_size=FALLBACK_PAGE_SIZE
         )
         
         # Update tickers table - update last_date and record count
-        last_date = max(v[0] for v in values)
-        
-        cursor.execute("""
-            UPDATE tickers 
-            SET last_date = %s,
-                record_count = (
-                    SELECT COUNT(*) 
-                    FROM yahoo_adjusted_stock_prices 
-                    WHERE symbol = %s
-                ),
-                last_updated = NOW()
-            WHERE symbol = %s
-        """, (last_date, symbol, symbol))
-        
-        conn.commit()
+        if pending_updates is not None:
+            cursor.execute("RELEASE SAVEPOINT upsert_ticker")
+            pending_updates.append(symbol)
+        else:
+            cursor.execute(TICKER_STATS_REFRESH_SQL, ([symbol],))
+            conn.commit()
         cursor.close()
         
         log.write(f" {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: ✓ {symbol} (lookback): {len(values)} records\n")
@@ -1484,9 +1754,94 @@ def upsert_ticker_data(conn, symbol, data, log):
         return (True, len(values))
         
     except Exception as e:
-        conn.rollback()
+        rollback_pending(conn, pending_updates, savepoint, 'upsert_ticker')
         raise e
 
+def upsert_lookback_chunk(db_pool, symbols, data, lookback_days):
+    """Per-symbol lookback fallback for one chunk of symbols on a pooled connection
+    
+    The chunk runs in one transaction (each symbol in its own savepoint) with the
+    tickers rows refreshed by one grouped UPDATE before the commit. Runs on a worker
+    thread, so log lines are collected and returned for the caller to write.
+    
+    Returns:
+        (fallback_records, failures, log_text): {symbol: records} for committed symbols,
+        a list of (symbol, period, reason) tuples for the rest, and the chunk's log lines
+    """
+    period = f'{lookback_days}d'
+    fallback_records = {}
+    failures = []
+    log = io.StringIO()
+    conn = db_pool.getconn()
+    try:
+        pending_updates = []
+        for symbol in symbols:
+            try:
+                success, records = upsert_ticker_data(conn, symbol, data, log, pending_updates=pending_updates)
+                if success:
+                    fallback_records[symbol] = records
+                else:
+                    failures.append((symbol, period, 'No data available'))
+            except Exception as e:
+                failures.append((symbol, period, str(e)))
+                log.write(f"  ✗ {symbol} ({period}): {e}\n")
+        try:
+            refresh_ticker_stats(conn, pending_updates)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            log.write(f"  ✗ Fallback commit ({period}) failed: {e}\n")
+            failures.extend((symbol, period, str(e)) for symbol in fallback_records)
+            fallback_records = {}
+    finally:
+        db_pool.putconn(conn)
+    return fallback_records, failures, log.getvalue()
+
+def rollback_pending(conn, pending, savepoint, name):
+    """Undo a failed per-symbol write
+    
+    Standalone writes (pending is None) roll back the whole transaction; deferred
+    writes only roll back to their savepoint so the caller's transaction survives.
+    """
+    if pending is None:
+        conn.rollback()
+    elif savepoint:
+        rollback_cursor = conn.cursor()
+        rollback_cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        rollback_cursor.close()
+
+def refresh_ticker_stats(conn, symbols):
+    """Recompute last_date and record_count for the given tickers in one statement"""
+    if not symbols:
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TICKER_STATS_REFRESH_SQL, (list(symbols),))
+    finally:
+        cursor.close()
+
+def flush_ticker_updates(conn, pending_updates, sql, page_size=500):
+    """Send the tickers UPDATEs queued by delete_and_insert_ticker_data()
+    in as few round trips as possible"""
+    if not pending_updates:
+        return
+    cursor = conn.cursor()
+    try:
+        execute_batch(cursor, sql, pending_updates, page_size=page_size)
+    finally:
+        cursor.close()
+
+def flush_new_ticker_rows(conn, pending_inserts, page_size=1000):
+    """Insert the tickers rows queued by insert_ticker_data() in one execute_values call"""
+    if not pending_inserts:
+        return
+    cursor = conn.cursor()
+    try:
+        execute_values(cursor, NEW_TICKER_INSERT_SQL, pending_inserts,
+                       template=NEW_TICKER_ROW_TEMPLATE, page_size=page_size)
+    finally:
+        cursor.close()
+
 if __name__ == "__main__":
     import argparse
     
@@ -1,22 +1,38 @@
 from store_stock_data import get_db_connection
 
-def get_all_dates_with_prices():
+def get_all_dates_with_prices(since=None, until=None):
     """
     Get all unique dates from yahoo_adjusted_stock_prices table.
     
+    The range is applied in SQL on the raw timestamp, so TimescaleDB only scans
+    the chunks that overlap it instead of the whole hypertable.
+    
+    Args:
+        since: Optional first date (datetime.date) to include
+        until: Optional last date (datetime.date) to include
+    
     Returns:
         List of datetime.date objects, sorted ascending
     """
+    conditions = ["close IS NOT NULL"]
+    params = []
+    if since:
+        conditions.append("timestamp >= %s")
+        params.append(since)
+    if until:
+        conditions.append("timestamp < %s + INTERVAL '1 day'")
+        params.append(until)
+    
     conn = get_db_connection(statement_timeout_seconds=600)
     cursor = conn.cursor()
     try:
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT time_bucket('1 day', timestamp)::DATE as price_date
             FROM yahoo_adjusted_stock_prices
-            WHERE close IS NOT NULL
+            WHERE {' AND '.join(conditions)}
             GROUP BY time_bucket('1 day', timestamp)
             ORDER BY price_date ASC
-        """)
+        """, params)
         dates = [row[0] for row in cursor.fetchall()]
         return dates
     finally:
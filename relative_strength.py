@@ -1,155 +1,186 @@
+import io
 import pandas as pd
 from datetime import datetime
 from datetime import date
+from datetime import timedelta
+from dateutil.relativedelta import relativedelta
 import argparse
+import os
 import sys
-from psycopg2.extras import execute_values
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import util as mp_util
 from store_stock_data import get_db_connection
 from get_price import get_all_dates_with_prices
 from backend.utils.date_utils import get_calc_date
 
-def calculate_relative_strength_batch(conn, symbols_batch, calc_date):
+# stock_indicators columns written by the batch step (rs_rating is set afterwards)
+STORED_COLUMNS = [
+    'symbol', 'calculation_date', 'weighted_change',
+    'pct_change_3mo', 'pct_change_6mo', 'pct_change_9mo', 'pct_change_12mo'
+]
+
+# Server-side prepared statement for the per-batch window price lookup. The database
+# picks the latest close in each window (one index probe per symbol and window via
+# (symbol, timestamp DESC)), so at most 5 rows per symbol come back instead of
+# 13 months of history. Prepared once per connection so batches skip parse/plan.
+WINDOW_PRICES_STATEMENT = 'rs_window_prices'
+PREPARE_WINDOW_PRICES_SQL = f"""
+    PREPARE {WINDOW_PRICES_STATEMENT}(TEXT[], TEXT[], TIMESTAMP[], TIMESTAMP[]) AS
+    SELECT s.symbol, w.label, p.price_date, p.close
+    FROM unnest($1) AS s(symbol)
+    CROSS JOIN unnest($2, $3, $4) AS w(label, window_start, window_end)
+    CROSS JOIN LATERAL (
+        SELECT timestamp::DATE AS price_date, close
+        FROM yahoo_adjusted_stock_prices
+        WHERE symbol = s.symbol
+          AND timestamp >= w.window_start
+          AND timestamp <= w.window_end
+        ORDER BY timestamp DESC
+        LIMIT 1
+    ) AS p
+"""
+
+# Percentile rank (1-99 scale) for every symbol on a date, ranked and written in one
+# statement. Higher weighted_change = higher rank; ties share the lowest rank
+# (rank / count, scaled to 1-99). The scale is computed in DOUBLE PRECISION so
+# ROUND() ties go to the nearest even integer, matching the np.round() ratings
+# stored before this moved into SQL (ROUND(NUMERIC) would round halves up).
+# Returns (updated count, min rating, max rating).
+RS_RATING_UPDATE_SQL = """
+    WITH ranked AS (
+        SELECT symbol,
+               RANK() OVER (ORDER BY weighted_change) AS min_rank,
+               COUNT(*) OVER () AS total
+        FROM stock_indicators
+        WHERE calculation_date = %s
+          AND weighted_change IS NOT NULL
+    ),
+    updated AS (
+        UPDATE stock_indicators
+        SET rs_rating = LEAST(99, GREATEST(1, ROUND(ranked.min_rank::DOUBLE PRECISION / ranked.total * 98 + 1)))::INTEGER
+        FROM ranked
+        WHERE stock_indicators.symbol = ranked.symbol
+          AND stock_indicators.calculation_date = %s
+        RETURNING stock_indicators.rs_rating
+    )
+    SELECT COUNT(*), MIN(rs_rating), MAX(rs_rating) FROM updated
+"""
+
+def prepare_window_prices(conn):
+    """
+    Prepare the window price statement on this connection if it isn't already.
+    Prepared statements live for the whole session, so a reused connection only
+    pays for this once. Commits, so call it before any pending work.
+    
+    Args:
+        conn: Database connection
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (WINDOW_PRICES_STATEMENT,))
+        if cursor.fetchone() is None:
+            cursor.execute(PREPARE_WINDOW_PRICES_SQL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+def build_price_windows(calc_date):
+    """
+    Build the (label, first_date, last_date) windows the batch query picks prices from.
+    The current price may come from anywhere in the last 13 months; each lookback
+    price must fall in the 7-day window ending at its target date.
+    
+    Args:
+        calc_date: Date to calculate for (datetime.date)
+    
+    Returns:
+        List of (label, first_date, last_date) tuples, current window first
+    """
+    windows = [('current', calc_date - relativedelta(months=13), calc_date)]
+    for months in (3, 6, 9, 12):
+        target = calc_date - relativedelta(months=months)
+        windows.append((f'{months}mo', target - timedelta(days=7), target))
+    return windows
+
+def calculate_relative_strength_batch(conn, symbols_batch, calc_date, windows=None):
     """
     Calculate relative strength metrics for a batch of symbols.
     Returns DataFrame with calculated values (without rs_rating).
     
     Args:
-        conn: Database connection
+        conn: Database connection (prepare_window_prices must have been called on it)
         symbols_batch: List of symbols to process
         calc_date: Date to calculate for (datetime.date)
+        windows: Optional result of build_price_windows(calc_date), computed if None
     
     Returns:
         DataFrame with columns: symbol, calculation_date, weighted_change, 
         pct_change_3mo, pct_change_6mo, pct_change_9mo, pct_change_12mo,
         current_price_date, price_3mo_date, price_6mo_date, price_9mo_date, price_12mo_date
     """
-    calc_timestamp = pd.Timestamp(calc_date)
-    target_3mo = calc_timestamp - pd.DateOffset(months=3)
-    target_6mo = calc_timestamp - pd.DateOffset(months=6)
-    target_9mo = calc_timestamp - pd.DateOffset(months=9)
-    target_12mo = calc_timestamp - pd.DateOffset(months=12)
-    
-    # Pull price data for this batch (13 months of data)
-    start_date = (calc_timestamp - pd.DateOffset(months=13)).date()
+    if windows is None:
+        windows = build_price_windows(calc_date)
     
     # Convert dates to timestamps for efficient index usage
-    start_timestamp = datetime.combine(start_date, datetime.min.time())
-    end_timestamp = datetime.combine(calc_date, datetime.max.time())
-    
-    query = """
-        SELECT symbol, timestamp::DATE as price_date, close
-        FROM yahoo_adjusted_stock_prices
-        WHERE symbol = ANY(%s)
-          AND timestamp >= %s
-          AND timestamp <= %s
-        ORDER BY symbol, timestamp DESC
-    """
+    labels = [label for label, _, _ in windows]
+    window_starts = [datetime.combine(first, datetime.min.time()) for _, first, _ in windows]
+    window_ends = [datetime.combine(last, datetime.max.time()) for _, _, last in windows]
     
     # Use cursor directly for better array parameter handling and to avoid pandas warning
     cursor = conn.cursor()
     try:
-        cursor.execute(query, (symbols_batch, start_timestamp, end_timestamp))
-        
-        # Fetch results and convert to DataFrame
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
-        df = pd.DataFrame(rows, columns=columns)
+        cursor.execute(f"EXECUTE {WINDOW_PRICES_STATEMENT}(%s, %s, %s, %s)",
+                       (list(symbols_batch), labels, window_starts, window_ends))
+        df = pd.DataFrame(cursor.fetchall(), columns=['symbol', 'label', 'price_date', 'close'])
     finally:
         cursor.close()
     
     if df.empty:
         return pd.DataFrame()
     
-    results = []
+    # One row per symbol, one column per window
+    closes = df.pivot(index='symbol', columns='label', values='close').reindex(columns=labels).astype('float64')
+    dates = df.pivot(index='symbol', columns='label', values='price_date').reindex(columns=labels)
     
-    for symbol in symbols_batch:
-        symbol_data = df[df['symbol'] == symbol].copy()
-        if symbol_data.empty:
-            continue
-        
-        symbol_data = symbol_data.sort_values('price_date', ascending=False)
-        
-        # Get current price (most recent on or before calc_date)
-        current_mask = symbol_data['price_date'] <= calc_date
-        if not current_mask.any():
-            continue
-        current_price = float(symbol_data[current_mask].iloc[0]['close'])
-        current_date = symbol_data[current_mask].iloc[0]['price_date']
-        
-        # Get price 3 months ago (within 7-day window)
-        target_3mo_date = target_3mo.date()
-        window_start_3mo = (target_3mo - pd.Timedelta(days=7)).date()
-        mask_3mo = (symbol_data['price_date'] <= target_3mo_date) & \
-                   (symbol_data['price_date'] >= window_start_3mo)
-        if not mask_3mo.any():
-            continue
-        price_3mo = float(symbol_data[mask_3mo].iloc[0]['close'])
-        date_3mo = symbol_data[mask_3mo].iloc[0]['price_date']
-        
-        # Get price 6 months ago
-        target_6mo_date = target_6mo.date()
-        window_start_6mo = (target_6mo - pd.Timedelta(days=7)).date()
-        mask_6mo = (symbol_data['price_date'] <= target_6mo_date) & \
-                   (symbol_data['price_date'] >= window_start_6mo)
-        if not mask_6mo.any():
-            continue
-        price_6mo = float(symbol_data[mask_6mo].iloc[0]['close'])
-        date_6mo = symbol_data[mask_6mo].iloc[0]['price_date']
-        
-        # Get price 9 months ago
-        target_9mo_date = target_9mo.date()
-        window_start_9mo = (target_9mo - pd.Timedelta(days=7)).date()
-        mask_9mo = (symbol_data['price_date'] <= target_9mo_date) & \
-                   (symbol_data['price_date'] >= window_start_9mo)
-        if not mask_9mo.any():
-            continue
-        price_9mo = float(symbol_data[mask_9mo].iloc[0]['close'])
-        date_9mo = symbol_data[mask_9mo].iloc[0]['price_date']
-        
-        # Get price 12 months ago
-        target_12mo_date = target_12mo.date()
-        window_start_12mo = (target_12mo - pd.Timedelta(days=7)).date()
-        mask_12mo = (symbol_data['price_date'] <= target_12mo_date) & \
-                    (symbol_data['price_date'] >= window_start_12mo)
-        if not mask_12mo.any():
-            continue
-        price_12mo = float(symbol_data[mask_12mo].iloc[0]['close'])
-        date_12mo = symbol_data[mask_12mo].iloc[0]['price_date']
-        
-        # Calculate percentage changes
-        pct_change_3mo = ((current_price - price_3mo) / price_3mo * 100) if price_3mo > 0 else None
-        pct_change_6mo = ((price_3mo - price_6mo) / price_6mo * 100) if price_6mo > 0 and price_3mo > 0 else None
-        pct_change_9mo = ((price_6mo - price_9mo) / price_9mo * 100) if price_9mo > 0 and price_6mo > 0 else None
-        pct_change_12mo = ((price_9mo - price_12mo) / price_12mo * 100) if price_12mo > 0 and price_9mo > 0 else None
-        
-        # Calculate weighted change
-        if all(x is not None for x in [pct_change_3mo, pct_change_6mo, pct_change_9mo, pct_change_12mo]):
-            weighted_change = (
-                pct_change_3mo * 0.4 +
-                pct_change_6mo * 0.2 +
-                pct_change_9mo * 0.2 +
-                pct_change_12mo * 0.2
-            )
-            
-            results.append({
-                'symbol': symbol,
-                'calculation_date': calc_date,
-                'weighted_change': round(weighted_change, 2),
-                'pct_change_3mo': round(pct_change_3mo, 2),
-                'pct_change_6mo': round(pct_change_6mo, 2),
-                'pct_change_9mo': round(pct_change_9mo, 2),
-                'pct_change_12mo': round(pct_change_12mo, 2),
-                'current_price_date': current_date,
-                'price_3mo_date': date_3mo,
-                'price_6mo_date': date_6mo,
-                'price_9mo_date': date_9mo,
-                'price_12mo_date': date_12mo
-            })
-    
-    return pd.DataFrame(results)
+    # Symbols missing any window's price are skipped, as are non-positive lookback prices
+    keep = closes.notna().all(axis=1) & (closes[['3mo', '6mo', '9mo', '12mo']] > 0).all(axis=1)
+    closes = closes[keep]
+    dates = dates[keep]
+    if closes.empty:
+        return pd.DataFrame()
+    
+    # Calculate percentage changes
+    pct_change_3mo = (closes['current'] - closes['3mo']) / closes['3mo'] * 100
+    pct_change_6mo = (closes['3mo'] - closes['6mo']) / closes['6mo'] * 100
+    pct_change_9mo = (closes['6mo'] - closes['9mo']) / closes['9mo'] * 100
+    pct_change_12mo = (closes['9mo'] - closes['12mo']) / closes['12mo'] * 100
+    
+    # Calculate weighted change
+    weighted_change = (
+        pct_change_3mo * 0.4 +
+        pct_change_6mo * 0.2 +
+        pct_change_9mo * 0.2 +
+        pct_change_12mo * 0.2
+    )
+    
+    return pd.DataFrame({
+        'symbol': closes.index,
+        'calculation_date': calc_date,
+        'weighted_change': weighted_change.round(2),
+        'pct_change_3mo': pct_change_3mo.round(2),
+        'pct_change_6mo': pct_change_6mo.round(2),
+        'pct_change_9mo': pct_change_9mo.round(2),
+        'pct_change_12mo': pct_change_12mo.round(2),
+        'current_price_date': dates['current'],
+        'price_3mo_date': dates['3mo'],
+        'price_6mo_date': dates['6mo'],
+        'price_9mo_date': dates['9mo'],
+        'price_12mo_date': dates['12mo']
+    }).reset_index(drop=True)
 
 
-def calculate_and_store_relative_strength(calc_date=None, batch_size=500):
+def calculate_and_store_relative_strength(calc_date=None, batch_size=500, conn=None):
     """
     Calculate and store Relative Strength for all symbols in batches.
     
@@ -161,6 +192,7 @@ def calculate_and_store_relative_strength(calc_date=None, batch_size=500):
     Args:
         calc_date: Date to calculate for (default: determined by get_calc_date())
         batch_size: Number of symbols to process per batch
+        conn: Optional open connection to reuse (left open); a new one is opened and closed if None
     """
 
     
@@ -171,8 +203,11 @@ def calculate_and_store_relative_strength(calc_date=None, batch_size=500):
     print(f"RELATIVE STRENGTH CALCULATION - {calc_date}")
     print(f"{'='*70}")
     
+    owns_conn = conn is None
+    if owns_conn:
+        conn = get_db_connection(statement_timeout_seconds=600)
+    
     # Get all symbols
-    conn = get_db_connection(statement_timeout_seconds=600)
     cursor = conn.cursor()
     cursor.execute("""
     SELECT symbol 
@@ -189,6 +224,9 @@ def calculate_and_store_relative_strength(calc_date=None, batch_size=500):
     total_processed = 0
     batch_num = 0
     
+    prepare_window_prices(conn)
+    windows = build_price_windows(calc_date)
+    
     for i in range(0, len(all_symbols), batch_size):
         batch = all_symbols[i:i + batch_size]
         batch_num += 1
@@ -197,35 +235,33 @@ def calculate_and_store_relative_strength(calc_date=None, batch_size=500):
         print(f"\nBatch {batch_num}/{total_batches}: Processing {len(batch)} symbols...")
         
         # Calculate for this batch
-        batch_results = calculate_relative_strength_batch(conn, batch, calc_date)
+        batch_results = calculate_relative_strength_batch(conn, batch, calc_date, windows)
         
         if batch_results.empty:
             print(f"  ⚠ No results for this batch")
             continue
         
-        # Store to database (UPSERT - update if exists, insert if new)
+        # Store to database (UPSERT - update if exists, insert if new): COPY the
+        # batch into a temp table, then upsert from it in one statement
         cursor = conn.cursor()
         try:
-            values = [
-                (
-                    row['symbol'],
-                    row['calculation_date'],
-                    row['weighted_change'],
-                    row['pct_change_3mo'],
-                    row['pct_change_6mo'],
-                    row['pct_change_9mo'],
-                    row['pct_change_12mo']
-                )
-                for _, row in batch_results.iterrows()
-            ]
+            buffer = io.StringIO()
+            batch_results[STORED_COLUMNS].to_csv(buffer, header=False, index=False)
+            buffer.seek(0)
             
-            execute_values(
-                cursor,
-                """
-                INSERT INTO stock_indicators 
-                (symbol, calculation_date, weighted_change, pct_change_3mo, 
-                 pct_change_6mo, pct_change_9mo, pct_change_12mo)
-                VALUES %s
+            cursor.execute("""
+                CREATE TEMP TABLE stock_indicators_stage
+                (LIKE stock_indicators INCLUDING DEFAULTS)
+                ON COMMIT DROP
+            """)
+            cursor.copy_expert(
+                f"COPY stock_indicators_stage ({', '.join(STORED_COLUMNS)}) FROM STDIN WITH CSV",
+                buffer
+            )
+            cursor.execute(f"""
+                INSERT INTO stock_indicators ({', '.join(STORED_COLUMNS)})
+                SELECT {', '.join(STORED_COLUMNS)}
+                FROM stock_indicators_stage
                 ON CONFLICT (symbol, calculation_date) 
                 DO UPDATE SET
                     weighted_change = EXCLUDED.weighted_change,
@@ -233,10 +269,7 @@ def calculate_and_store_relative_strength(calc_date=None, batch_size=500):
                     pct_change_6mo = EXCLUDED.pct_change_6mo,
                     pct_change_9mo = EXCLUDED.pct_change_9mo,
                     pct_change_12mo = EXCLUDED.pct_change_12mo
-                """,
-                values,
-                page_size=batch_size
-            )
+            """)
             
             conn.commit()
             cursor.close()
@@ -256,96 +289,84 @@ def calculate_and_store_relative_strength(calc_date=None, batch_size=500):
     
     cursor = conn.cursor()
     try:
-        # Get all weighted_change values for this date
-        cursor.execute("""
-            SELECT symbol, weighted_change
-            FROM stock_indicators
-            WHERE calculation_date = %s
-              AND weighted_change IS NOT NULL
-            ORDER BY weighted_change DESC
-        """, (calc_date,))
+        # Rank and update in one statement - nothing is shipped to Python
+        cursor.execute(RS_RATING_UPDATE_SQL, (calc_date, calc_date))
         
-        all_results = cursor.fetchall()
+        updated_count, min_rating, max_rating = cursor.fetchone()
         
-        if not all_results:
+        if not updated_count:
             print("  ⚠ No data found for percentile ranking")
+            conn.rollback()
+            cursor.close()
+            if owns_conn:
+                conn.close()
             return
         
-        # Convert to DataFrame for easy percentile calculation
-        df = pd.DataFrame(all_results, columns=['symbol', 'weighted_change'])
-        
-        # Calculate percentile rank (1-99 scale)
-        # Higher weighted_change = higher rank
-        df['rs_rating'] = df['weighted_change'].rank(pct=True, method='min')
-        df['rs_rating'] = (df['rs_rating'] * 98 + 1).round().astype(int)
-        df['rs_rating'] = df['rs_rating'].clip(1, 99)
-        
-        # Update rs_rating in database
-        update_values = [
-            (row['rs_rating'], row['symbol'], calc_date)
-            for _, row in df.iterrows()
-        ]
-        
-        execute_values(
-            cursor,
-            """
-            UPDATE stock_indicators
-            SET rs_rating = v.rs_rating
-            FROM (VALUES %s) AS v(rs_rating, symbol, calculation_date)
-            WHERE stock_indicators.symbol = v.symbol
-              AND stock_indicators.calculation_date = v.calculation_date
-            """,
-            update_values,
-            page_size=1000,
-            template="(%s::INTEGER, %s::TEXT, %s::DATE)"
-        )
-        
         conn.commit()
         cursor.close()
         
-        print(f"  ✓ Updated rs_rating for {len(df)} symbols")
-        print(f"    RS Rating range: {df['rs_rating'].min()} - {df['rs_rating'].max()}")
+        print(f"  ✓ Updated rs_rating for {updated_count} symbols")
+        print(f"    RS Rating range: {min_rating} - {max_rating}")
         
     except Exception as e:
         conn.rollback()
         cursor.close()
         print(f"  ✗ Error calculating percentile ranks: {e}")
+        if owns_conn:
+            conn.close()
         raise
     
-    conn.close()
+    if owns_conn:
+        conn.close()
     print(f"\n{'='*70}")
     print(f"RELATIVE STRENGTH CALCULATION COMPLETE")
     print(f"{'='*70}")
 
-def calculate_and_store_relative_strength_for_all_dates(batch_size=500, start_date=None, end_date=None, skip_existing=False):
+# Connection held by each all-dates worker process for its whole lifetime
+_worker_conn = None
+
+def _open_worker_connection():
+    """ProcessPoolExecutor initializer: open this worker's connection once
+    
+    The close is registered as a multiprocessing finalizer rather than with atexit:
+    forked workers leave through os._exit, which skips atexit handlers.
+    """
+    global _worker_conn
+    _worker_conn = get_db_connection(statement_timeout_seconds=600)
+    mp_util.Finalize(None, _worker_conn.close, exitpriority=10)
+
+def _calculate_date_in_worker(calc_date, batch_size):
+    """Run one date on the worker's persistent connection (the date's symbols are queried there)"""
+    calculate_and_store_relative_strength(calc_date=calc_date, batch_size=batch_size, conn=_worker_conn)
+
+def calculate_and_store_relative_strength_for_all_dates(batch_size=500, start_date=None, end_date=None, skip_existing=False,
+                                                         max_workers=None):
     """
     Calculate and store Relative Strength for all dates with price data.
     
+    Dates are independent, so they are processed in parallel worker processes.
+    Each worker keeps one database connection for all of its dates and looks up
+    each date's symbols on it, so no per-date symbol lists are held or shipped here.
+    
     Args:
         batch_size: Number of symbols to process per batch
         start_date: Optional start date (datetime.date) - only process dates >= this
         end_date: Optional end date (datetime.date) - only process dates <= this
         skip_existing: If True, skip dates that already have calculations
+        max_workers: Worker processes (default: CPU count, capped at 4 to limit DB write contention)
     """
     print(f"\n{'='*70}")
     print(f"RELATIVE STRENGTH CALCULATION - ALL DATES")
     print(f"{'='*70}")
     
-    # Get all dates
-    all_dates = get_all_dates_with_prices()
-    
-    if not all_dates:
-        print("No dates found in database")
-        return
-    
-    # Filter by date range if provided
-    if start_date:
-        all_dates = [d for d in all_dates if d >= start_date]
-    if end_date:
-        all_dates = [d for d in all_dates if d <= end_date]
+    # Get all dates in the requested range (filtered in SQL)
+    all_dates = get_all_dates_with_prices(since=start_date, until=end_date)
     
     if not all_dates:
-        print(f"No dates in specified range")
+        if start_date or end_date:
+            print(f"No dates in specified range")
+        else:
+            print("No dates found in database")
         return
     
     print(f"\nFound {len(all_dates)} dates to process")
@@ -376,25 +397,31 @@ def calculate_and_store_relative_strength_for_all_dates(batch_size=500, start_da
     
     print(f"Processing {len(dates_to_process)} dates...\n")
     
-    # Process each date
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, 4)
+    print(f"Using {max_workers} worker processes")
+    
+    # Process dates in parallel
     successful = 0
     failed = 0
     failed_dates = []
     
-    for i, calc_date in enumerate(dates_to_process, 1):
-        print(f"\n{'='*70}")
-        print(f"Processing date {i}/{len(dates_to_process)}: {calc_date}")
-        print(f"{'='*70}")
-        
-        try:
-            calculate_and_store_relative_strength(calc_date=calc_date, batch_size=batch_size)
-            successful += 1
-        except Exception as e:
-            failed += 1
-            failed_dates.append((calc_date, str(e)))
-            print(f"\n✗ ERROR processing {calc_date}: {e}")
-            import traceback
-            traceback.print_exc()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_open_worker_connection) as executor:
+        futures = {
+            executor.submit(_calculate_date_in_worker, calc_date, batch_size): calc_date
+            for calc_date in dates_to_process
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            calc_date = futures[future]
+            try:
+                future.result()
+                successful += 1
+                print(f"\n✓ Finished date {i}/{len(dates_to_process)}: {calc_date}")
+            except Exception as e:
+                failed += 1
+                failed_dates.append((calc_date, str(e)))
+                print(f"\n✗ ERROR processing {calc_date}: {e}")
+                traceback.print_exception(e)
     
     # Summary
     print(f"\n{'='*70}")
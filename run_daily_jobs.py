@@ -6,11 +6,12 @@ with Telegram notifications for success/failure.
 
 import os
 import sys
-import subprocess
 import json
+import time
+import traceback
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List
+from typing import Callable, Dict
 
 # Set up environment variables
 os.environ['PYTHONUNBUFFERED'] = '1'  # Disable buffering for real-time logs
@@ -23,52 +24,94 @@ sys.path.insert(0, str(SCRIPT_DIR))
 # Import telegram notifier
 from telegram_notifier import send_telegram_message, format_job_status
 
-def run_script(script_name: str, args: List[str] = None) -> Dict:
-    """Run a script and capture results"""
-    if args is None:
-        args = []
+def write_error_log(prefix: str, error: BaseException) -> Path:
+    """Write a job's error and traceback to logs/<prefix>_error_<timestamp>.log"""
+    error_log_path = SCRIPT_DIR / "logs" / f"{prefix}_error_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    error_log_path.parent.mkdir(parents=True, exist_ok=True)
     
-    script_path = SCRIPT_DIR / script_name
+    with open(error_log_path, 'w') as f:
+        f.write(f"Error at {datetime.now()}\n")
+        f.write(f"{'='*70}\n")
+        f.write(f"{error!r}\n")
+        f.write(f"{'='*70}\n")
+        traceback.print_exception(type(error), error, error.__traceback__, file=f)
+    
+    return error_log_path
+
+def run_callable(name: str, func: Callable, error_log_prefix: str, **kwargs) -> Dict:
+    """Run a job's entry point in this process and capture results
+    
+    Avoids a fresh interpreter (and re-importing pandas/yfinance/psycopg2) per job.
+    An exception counts as failure (exit code 1), matching the script wrappers, and
+    is written to an error log. KeyboardInterrupt / non-zero SystemExit are logged,
+    reported to Telegram and re-raised so the orchestrator still stops.
+    """
     start_time = datetime.now()
+    start = time.perf_counter()
     
     print(f"\n{'='*70}")
-    print(f"Running: {script_name}")
+    print(f"Running: {name}")
     print(f"Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*70}\n")
     
-    try:
-        result = subprocess.run(
-            [sys.executable, str(script_path)] + args,
-            capture_output=False,  # Let output go to console
-            check=False  # Don't raise on non-zero exit
-        )
-        
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        success = result.returncode == 0
-        
-        return {
-            'script': script_name,
+    def result(success: bool, exit_code: int, error: str = None) -> Dict:
+        job_result = {
+            'script': name,
             'success': success,
-            'exit_code': result.returncode,
+            'exit_code': exit_code,
             'start_time': start_time,
-            'end_time': end_time,
-            'duration_seconds': duration,
+            'end_time': datetime.now(),
+            'duration_seconds': time.perf_counter() - start,
         }
-        
+        if error is not None:
+            job_result['error'] = error
+        return job_result
+    
+    try:
+        func(**kwargs)
+        return result(True, 0)
+    
+    except SystemExit as e:
+        if e.code in (0, None):
+            return result(True, 0)
+        exit_code = e.code if isinstance(e.code, int) else 1
+        job_result = result(False, exit_code, f"SystemExit({e.code!r})")
+        error_log_path = write_error_log(error_log_prefix, e)
+        print(f"Error log saved to: {error_log_path}")
+        send_telegram_message(format_job_status([job_result], False, job_result['duration_seconds']))
+        raise
+    
+    except KeyboardInterrupt as e:
+        print("\n\n⚠️  Interrupted by user.")
+        job_result = result(False, 130, "Interrupted (KeyboardInterrupt)")
+        error_log_path = write_error_log(error_log_prefix, e)
+        print(f"Error log saved to: {error_log_path}")
+        send_telegram_message(format_job_status([job_result], False, job_result['duration_seconds']))
+        raise
+    
     except Exception as e:
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        
-        return {
-            'script': script_name,
-            'success': False,
-            'exit_code': -1,
-            'start_time': start_time,
-            'end_time': end_time,
-            'duration_seconds': duration,
-            'error': str(e),
-        }
+        print(f"\n✗ Fatal Error: {e}")
+        traceback.print_exc()
+        error_log_path = write_error_log(error_log_prefix, e)
+        print(f"Error log saved to: {error_log_path}")
+        return result(False, 1, str(e))
+
+def _daily_update_job():
+    # Imported here so an import failure is reported like any other job failure
+    from daily_update_stocks import daily_update_stocks
+    daily_update_stocks()
+
+def _indicators_job():
+    from calculate_indicators import calculate_and_store_indicators
+    calculate_and_store_indicators()
+
+def run_daily_update() -> Dict:
+    """Run the daily stock update in-process"""
+    return run_callable('run_daily_update_ec2.py', _daily_update_job, error_log_prefix='ec2')
+
+def run_indicators() -> Dict:
+    """Run the stock indicators calculation in-process"""
+    return run_callable('calculate_indicators.py', _indicators_job, error_log_prefix='indicators')
 
 def main():
     """Main orchestrator"""
@@ -82,7 +125,7 @@ def main():
     results = []
     
     # Script 1: Daily Update
-    result1 = run_script('run_daily_update_ec2.py')
+    result1 = run_daily_update()
     results.append(result1)
     
     if not result1['success']:
@@ -103,7 +146,7 @@ def main():
         return 1
     
     # Script 2: Stock Indicators (only runs if first succeeded)
-    result2 = run_script('calculate_indicators.py')
+    result2 = run_indicators()
     results.append(result2)
     
     if not result2['success']:
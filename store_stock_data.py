@@ -2,12 +2,16 @@ from dotenv import load_dotenv
 import time
 import pandas as pd
 import yfinance as yf
+from yfinance.exceptions import YFTickerMissingError
 import os
 import psycopg2
+from psycopg2 import pool
 from datetime import datetime
-from psycopg2.extras import execute_values
 import sys
 import io
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Fix Windows Unicode encoding issues AND disable buffering
 if sys.platform == 'win32':
@@ -25,6 +29,72 @@ if sys.platform == 'win32':
 
 load_dotenv()
 
+# Concurrent yfinance history fetches in bulk_load_stocks (DB writes stay on one thread)
+FETCH_WORKERS = 8
+
+# Upper bound on Yahoo Finance symbol requests started per second across all fetch threads
+MAX_REQUESTS_PER_SECOND = 4
+
+# Symbols per yf.download call in bulk_load_stocks
+DOWNLOAD_CHUNK_SIZE = 100
+
+# Tickers written per transaction in bulk_load_stocks
+COMMIT_EVERY_TICKERS = 20
+
+# bulk_load_stocks rewrites its one-line console status every this many tickers
+STATUS_EVERY_TICKERS = 25
+
+# Symbols Yahoo returned no data for are not re-fetched by bulk_load_stocks for this many days
+NO_DATA_RETRY_DAYS = 7
+
+# Negative cache of symbols with no Yahoo data (see yahoo_table_generation.sql)
+INGEST_ERRORS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS stock_ingest_errors (
+        symbol TEXT PRIMARY KEY,
+        last_error TEXT,
+        retry_after TIMESTAMPTZ NOT NULL
+    )
+"""
+
+INGEST_ERROR_UPSERT_SQL = """
+    INSERT INTO stock_ingest_errors (symbol, last_error, retry_after)
+    VALUES (%s, %s, NOW() + make_interval(days => %s))
+    ON CONFLICT (symbol) DO UPDATE SET
+        last_error = EXCLUDED.last_error,
+        retry_after = EXCLUDED.retry_after
+"""
+
+# Symbols with prices loaded, recorded by copy_price_frame (see yahoo_table_generation.sql)
+INGEST_STATE_TABLE_SQL = """
+    CREATE TABLE stock_ingest_state (
+        symbol TEXT PRIMARY KEY
+    )
+"""
+
+# One-time seed of stock_ingest_state from the prices already loaded: walks the
+# (symbol, timestamp) index one symbol at a time (a recursive "loose index scan")
+INGEST_STATE_SEED_SQL = """
+    WITH RECURSIVE loaded AS (
+        (SELECT symbol FROM yahoo_adjusted_stock_prices ORDER BY symbol LIMIT 1)
+        UNION ALL
+        SELECT (
+            SELECT p.symbol FROM yahoo_adjusted_stock_prices p
+            WHERE p.symbol > loaded.symbol
+            ORDER BY p.symbol LIMIT 1
+        )
+        FROM loaded
+        WHERE loaded.symbol IS NOT NULL
+    )
+    INSERT INTO stock_ingest_state (symbol)
+    SELECT loaded.symbol
+    FROM loaded
+    WHERE loaded.symbol IS NOT NULL
+    ON CONFLICT (symbol) DO NOTHING
+"""
+
+_request_lock = threading.Lock()
+_next_request_at = 0.0
+
 def get_db_connection(statement_timeout_seconds=None):
     """Create and return database connection
     
@@ -50,35 +120,134 @@ def get_db_connection(statement_timeout_seconds=None):
     
     return conn
 
-def store_stock_data(symbol):
-    """Store OHLC data for a single stock"""
-    print(f"Fetching data for {symbol}...")
+def get_db_pool(max_conn=8, statement_timeout_seconds=None):
+    """Create a thread-safe connection pool with the same settings as get_db_connection
     
-    ticker = yf.Ticker(symbol)
-    df = ticker.history(period="1y", auto_adjust=True)
+    Args:
+        max_conn: Maximum number of pooled connections (one per worker thread)
+        statement_timeout_seconds: Optional timeout in seconds applied to every connection
     
-    cursor = conn.cursor()
-    count = 0
+    Returns:
+        psycopg2.pool.ThreadedConnectionPool (caller must closeall() when done)
+    """
+    options = f"-c statement_timeout={statement_timeout_seconds}s" if statement_timeout_seconds else None
+    return pool.ThreadedConnectionPool(
+        minconn=1,
+        maxconn=max_conn,
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        port=os.getenv('DB_PORT'),
+        dbname=os.getenv('DB_NAME'),
+        options=options
+    )
+
+def ensure_ingest_state_table(cursor):
+    """
+    Create stock_ingest_state if it doesn't exist yet, seeding it from the price table
+    in the same transaction. Seeding is tied to table creation (not to the table being
+    empty), so it runs exactly once. Call it once before loading (copy_price_frame
+    assumes the table exists).
+    
+    Args:
+        cursor: Database cursor (caller commits)
+    """
+    cursor.execute("SELECT to_regclass('stock_ingest_state') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute(INGEST_STATE_TABLE_SQL)
+    cursor.execute(INGEST_STATE_SEED_SQL)
+
+def copy_price_frame(cursor, symbol, df):
+    """
+    Stream a yfinance history frame into yahoo_adjusted_stock_prices with COPY.
+    
+    COPY has no ON CONFLICT, so the rows go into a session temp table first and
+    are moved over with INSERT ... ON CONFLICT DO NOTHING. The stage keeps the
+    yfinance timestamps as TIMESTAMPTZ so they are converted to the table's
+    TIMESTAMP exactly as a bound tz-aware datetime would be.
+    
+    Args:
+        cursor: Database cursor (caller commits)
+        symbol: Stock symbol
+        df: DataFrame from Ticker.history() (DatetimeIndex, Open/High/Low/Close/Volume)
+    
+    The symbol is also recorded in stock_ingest_state, which must already exist
+    (see ensure_ingest_state_table).
+    
+    Returns:
+        Number of rows actually inserted
+    """
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS price_frame_stage (
+            timestamp TIMESTAMPTZ,
+            symbol TEXT,
+            open DOUBLE PRECISION,
+            high DOUBLE PRECISION,
+            low DOUBLE PRECISION,
+            close DOUBLE PRECISION,
+            volume BIGINT
+        ) ON COMMIT DELETE ROWS
+    """)
+    # Several tickers may share one transaction (bulk_load_stocks), so clear the stage per call
+    cursor.execute("TRUNCATE price_frame_stage")
+    
+    # Missing prices are written as NaN, as the row-by-row insert stored them (an empty
+    # field would load as NULL); a missing volume becomes 0 so the cast can't fail the ticker
+    buf = io.StringIO()
+    df[['Open', 'High', 'Low', 'Close', 'Volume']].assign(
+        Volume=df['Volume'].fillna(0).astype('int64')
+    ).to_csv(buf, header=False, index=True, na_rep='NaN', date_format='%Y-%m-%d %H:%M:%S%z')
+    buf.seek(0)
+    cursor.copy_expert(
+        "COPY price_frame_stage (timestamp, open, high, low, close, volume) FROM STDIN WITH CSV",
+        buf
+    )
     
-    for date, row in df.iterrows():
-        cursor.execute("""
+    # Record the symbol as loaded (for get_completed_symbols) in the same statement
+    cursor.execute("""
+        WITH inserted AS (
             INSERT INTO yahoo_adjusted_stock_prices 
             (timestamp, symbol, open, high, low, close, volume)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            SELECT timestamp, %s, open, high, low, close, volume
+            FROM price_frame_stage
             ON CONFLICT (symbol, timestamp) DO NOTHING
-        """, (
-            date.to_pydatetime(),
-            symbol,
-            float(row['Open']),
-            float(row['High']),
-            float(row['Low']),
-            float(row['Close']),
-            int(row['Volume'])
-        ))
-        count += 1
+            RETURNING 1
+        ),
+        recorded AS (
+            INSERT INTO stock_ingest_state (symbol)
+            SELECT %s WHERE EXISTS (SELECT 1 FROM price_frame_stage)
+            ON CONFLICT (symbol) DO NOTHING
+        )
+        SELECT COUNT(*) FROM inserted
+    """, (symbol, symbol))
+    return cursor.fetchone()[0]
+
+def store_stock_data(symbol, conn=None):
+    """Store OHLC data for a single stock
     
-    conn.commit()
-    cursor.close()
+    Args:
+        symbol: Stock symbol
+        conn: Optional open connection to reuse (left open); a new one is opened and closed if None
+    """
+    print(f"Fetching data for {symbol}...")
+    
+    ticker = yf.Ticker(symbol)
+    df = ticker.history(period="1y", auto_adjust=True)
+    
+    owns_conn = conn is None
+    if owns_conn:
+        conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        ensure_ingest_state_table(cursor)
+        count = copy_price_frame(cursor, symbol, df)
+        
+        conn.commit()
+        cursor.close()
+    finally:
+        if owns_conn:
+            conn.close()
     print(f"✓ Stored {count} records for {symbol}")
 
 def get_all_us_tickers(limit=None):
@@ -94,21 +263,21 @@ def get_all_us_tickers(limit=None):
     # NASDAQ traded stocks
     nasdaq_url = 'ftp://ftp.nasdaqtrader.com/SymbolDirectory/nasdaqlisted.txt'
     nasdaq_df = pd.read_csv(nasdaq_url, sep='|')
-    nasdaq_symbols = nasdaq_df[nasdaq_df['Test Issue'] == 'N']['Symbol'].tolist()
+    nasdaq_symbols = nasdaq_df.loc[nasdaq_df['Test Issue'] == 'N', 'Symbol']
     
     # Other exchanges traded on NASDAQ
     other_url = 'ftp://ftp.nasdaqtrader.com/SymbolDirectory/otherlisted.txt'
     other_df = pd.read_csv(other_url, sep='|')
-    other_symbols = other_df[other_df['Test Issue'] == 'N']['ACT Symbol'].tolist()
+    other_symbols = other_df.loc[other_df['Test Issue'] == 'N', 'ACT Symbol']
     
     # Combine and clean
-    all_symbols = list(set(nasdaq_symbols + other_symbols))
+    all_symbols = pd.concat([nasdaq_symbols, other_symbols], ignore_index=True).drop_duplicates()
     
-    # Remove test symbols and special characters
-    all_symbols = [s for s in all_symbols if isinstance(s, str) and '$' not in s and '.' not in s]
-    all_symbols = [s for s in all_symbols if s != 'Symbol']  # Remove header
+    # Remove test symbols and special characters (non-strings give NaN and are dropped too)
+    has_special = all_symbols.str.contains(r'[$.]', regex=True, na=True)
+    all_symbols = all_symbols[~has_special & (all_symbols != 'Symbol')]  # Remove header
     
-    sorted_symbols = sorted(all_symbols)
+    sorted_symbols = sorted(all_symbols.tolist())
     
     # Apply limit if specified
     if limit and limit > 0:
@@ -130,60 +299,187 @@ def load_stock_list(filename='us_stock_tickers.txt'):
                 if line.strip() and not line.startswith('#')]
 
 def get_completed_symbols(conn):
-    """Get list of symbols already in database"""
+    """Get list of symbols already in database
+    
+    Reads the small stock_ingest_state summary table (plus tickers, which the daily
+    update maintains for symbols it adds) instead of scanning the price table.
+    stock_ingest_state must already exist (see ensure_ingest_state_table).
+    """
     cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT symbol FROM yahoo_adjusted_stock_prices")
-    completed = set(row[0] for row in cursor.fetchall())
+    cursor.execute("""
+        SELECT symbol FROM stock_ingest_state
+        UNION
+        SELECT symbol FROM tickers
+    """)
+    completed = frozenset(row[0] for row in cursor.fetchall())
+    conn.commit()
     cursor.close()
     return completed
 
-def store_stock_data_safe(symbol, conn):
-    """Store stock data using bulk insert"""
+def get_skipped_symbols(conn):
+    """Get symbols that recently returned no data and are not due for a retry yet"""
+    cursor = conn.cursor()
+    cursor.execute(INGEST_ERRORS_TABLE_SQL)
+    cursor.execute("SELECT symbol FROM stock_ingest_errors WHERE retry_after > NOW()")
+    skipped = frozenset(row[0] for row in cursor.fetchall())
+    conn.commit()
+    cursor.close()
+    return skipped
+
+def wait_for_request_slot(count=1):
+    """Block until the next `count` Yahoo Finance requests may start (paced to MAX_REQUESTS_PER_SECOND)"""
+    global _next_request_at
+    with _request_lock:
+        now = time.monotonic()
+        wait = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + count / MAX_REQUESTS_PER_SECOND
+    if wait > 0:
+        time.sleep(wait)
+
+def fetch_symbol_history(symbol):
+    """
+    Download all available adjusted history for one symbol, telling a symbol
+    Yahoo has no prices for apart from a failed request. yf.download doesn't
+    raise per symbol (a rate limit or timeout just leaves the symbol out), so
+    fetch_history_chunk re-fetches any symbol missing from its batch here.
+    
+    Returns:
+        Tuple of (DataFrame or None if Yahoo has no data, error message or None)
+    """
+    try:
+        wait_for_request_slot()
+        df = yf.Ticker(symbol).history(period="max", auto_adjust=True, raise_errors=True)
+    except YFTickerMissingError:
+        return None, None
+    except Exception as e:
+        return None, str(e)
+    
+    df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+    return (None if df.empty else df), None
+
+def fetch_history_chunk(symbols):
+    """
+    Download all available adjusted history for a chunk of symbols in one
+    yf.download call, paced by wait_for_request_slot (one slot per symbol).
+    Symbols the batch came back without are re-fetched one at a time, so a
+    symbol only counts as having no data when Yahoo really has none.
+    Safe to call from worker threads; yfinance's own threads are off so the
+    caller's pool bounds concurrency.
+    
+    Returns:
+        Tuple of ({symbol: DataFrame} for symbols with rows,
+                  {symbol: error message} for symbols whose fetch failed)
+    """
+    try:
+        wait_for_request_slot(len(symbols))
+        data = yf.download(
+            symbols,
+            period="max",  # All available data
+            group_by='ticker',
+            auto_adjust=True,
+            threads=False,
+            progress=False
+        )
+    except Exception as e:
+        return {}, dict.fromkeys(symbols, str(e))
+    
+    frames = {}
+    errors = {}
+    for symbol in symbols:
+        df = None
+        if data is not None and not data.empty:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol in data.columns.get_level_values(0):
+                    df = data[symbol]
+            else:
+                df = data
+        if df is not None:
+            df = df.dropna()
+        if df is None or df.empty:
+            df, error = fetch_symbol_history(symbol)
+            if error is not None:
+                errors[symbol] = error
+        if df is not None:
+            frames[symbol] = df
+    return frames, errors
+
+def fetch_chunks_in_order(executor, chunks, max_in_flight):
+    """
+    Run fetch_history_chunk over chunks on the executor and yield
+    (chunk, result) in submission order. At most max_in_flight chunks are
+    fetching or waiting to be consumed at once, so a slow consumer holds back
+    the fetchers instead of letting downloaded history pile up in memory.
+    """
+    in_flight = deque()
+    for chunk in chunks:
+        in_flight.append((chunk, executor.submit(fetch_history_chunk, chunk)))
+        if len(in_flight) >= max_in_flight:
+            chunk, future = in_flight.popleft()
+            yield chunk, future.result()
+    while in_flight:
+        chunk, future = in_flight.popleft()
+        yield chunk, future.result()
+
+def store_stock_data_safe(symbol, conn, df=None, cursor=None):
+    """
+    Store stock data using bulk insert
+    
+    Args:
+        symbol: Stock symbol
+        conn: Database connection
+        df: Optional already-fetched history; fetched from yfinance if None
+        cursor: Optional open cursor. When given, the write runs inside a savepoint
+                and is left uncommitted for the caller to commit with other tickers;
+                a failure only rolls back this ticker.
+    """
     try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period="max", auto_adjust=True)  # All available data
+        if df is None:
+            ticker = yf.Ticker(symbol)
+            df = ticker.history(period="max", auto_adjust=True)  # All available data
         
         if df.empty:
             return (False, 0, "No data available")
-        
-        values = [
-            (
-                date.to_pydatetime(),
-                symbol,
-                float(row['Open']),
-                float(row['High']),
-                float(row['Low']),
-                float(row['Close']),
-                int(row['Volume'])
-            )
-            for date, row in df.iterrows()
-        ]
-        
+    except Exception as e:
+        return (False, 0, str(e))
+    
+    if cursor is not None:
+        try:
+            cursor.execute("SAVEPOINT ticker")
+            copy_price_frame(cursor, symbol, df)
+            cursor.execute("RELEASE SAVEPOINT ticker")
+            return (True, len(df), None)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT ticker")
+            return (False, 0, str(e))
+    
+    try:
         cursor = conn.cursor()
         
-        execute_values(
-            cursor,
-            """
-            INSERT INTO yahoo_adjusted_stock_prices 
-            (timestamp, symbol, open, high, low, close, volume)
-            VALUES %s
-            ON CONFLICT (symbol, timestamp) DO NOTHING
-            """,
-            values,
-            page_size=5000  # Optimal for years of data
-        )
+        copy_price_frame(cursor, symbol, df)
         
         conn.commit()
         cursor.close()
-        return (True, len(values), None)
+        return (True, len(df), None)
         
     except Exception as e:
         conn.rollback()
         return (False, 0, str(e))
 
-def bulk_load_stocks(symbols, conn, resume=True):
+def bulk_load_stocks(symbols, conn, resume=True, max_workers=FETCH_WORKERS):
     """
     Bulk load stocks with progress tracking and resume capability
+    
+    History is downloaded DOWNLOAD_CHUNK_SIZE symbols per yf.download call on a
+    thread pool (network bound, paced by MAX_REQUESTS_PER_SECOND) while this
+    thread writes each symbol to the database in order, so the connection is only
+    ever used from one thread. At most 2 * max_workers chunks are fetched ahead
+    of the writer. Writes share one cursor and are committed every
+    COMMIT_EVERY_TICKERS tickers with synchronous_commit off for this session;
+    if a commit fails, that group's tickers are recorded as failed for retry.
+    
+    Symbols Yahoo had no data for (confirmed by a single-symbol fetch) are
+    remembered in stock_ingest_errors and skipped for NO_DATA_RETRY_DAYS (fetch
+    and database errors are not cached, as they are usually transient).
     """
     start_time = datetime.now()
     
@@ -194,12 +490,25 @@ def bulk_load_stocks(symbols, conn, resume=True):
     print(f"BULK STOCK LOAD - Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*70}")
     
+    # Create (and seed) the loaded-symbols table once, before any ticker is written
+    cursor = conn.cursor()
+    ensure_ingest_state_table(cursor)
+    conn.commit()
+    cursor.close()
+    
     # Resume from previous run if requested
     if resume:
         completed = get_completed_symbols(conn)
         symbols = [s for s in symbols if s not in completed]
         print(f"Resume mode: {len(completed)} already loaded, {len(symbols)} remaining")
     
+    # Skip symbols that recently had no data
+    skipped = get_skipped_symbols(conn)
+    if skipped:
+        before = len(symbols)
+        symbols = [s for s in symbols if s not in skipped]
+        print(f"Skipping {before - len(symbols)} symbols with no data in the last {NO_DATA_RETRY_DAYS} days")
+    
     total = len(symbols)
     stats = {
         'success': 0,
@@ -210,39 +519,85 @@ def bulk_load_stocks(symbols, conn, resume=True):
     }
     
     print(f"Loading {total} stocks...")
-    print(f"Estimated time: {total * 2 / 3600:.1f} hours")
+    print(f"Estimated time: {total / MAX_REQUESTS_PER_SECOND / 3600:.1f} hours")
     print(f"Log file: {log_file}\n")
     
     # Open log file
-    with open(log_file, 'w', encoding='utf-8') as log:
+    # Large buffer: per-ticker lines are only flushed with the 100-stock progress report
+    with open(log_file, 'w', encoding='utf-8', buffering=1 << 16) as log:
         log.write(f"Bulk Load Started: {start_time}\n")
         log.write(f"Total symbols: {total}\n\n")
         
-        for i, symbol in enumerate(symbols, 1):
-            # Store data
-            success, records, error = store_stock_data_safe(symbol, conn)
-            
-            # Update stats
-            if success:
-                stats['success'] += 1
-                stats['total_records'] += records
-                message = f"[{i}/{total}] {symbol}: ✓ {records} records"
-                print(message)
-                log.write(f"{message}\n")
-            else:
-                stats['failed'] += 1
-                stats['failed_symbols'].append((symbol, error))
-                message = f"[{i}/{total}] {symbol}: ✗ {error}"
+        # Bulk load is re-runnable (resume mode), so trade per-commit durability for speed
+        cursor = conn.cursor()
+        cursor.execute("SET synchronous_commit = off")
+        conn.commit()
+        pending = []  # (symbol, records) written since the last commit
+        
+        def commit_pending():
+            """Commit the open group of tickers; if that fails, count them as failed"""
+            try:
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                for symbol, records in pending:
+                    stats['success'] -= 1
+                    stats['failed'] += 1
+                    stats['total_records'] -= records
+                    stats['failed_symbols'].append((symbol, f"Commit failed: {e}"))
+                message = f"✗ Commit failed, {len(pending)} tickers marked failed: {e}"
                 print(message)
                 log.write(f"{message}\n")
-            
-            # Progress report every 100 stocks
-            if i % 100 == 0:
-                elapsed = (datetime.now() - start_time).total_seconds()
-                rate = i / elapsed if elapsed > 0 else 0
-                remaining_time = (total - i) / rate / 60 if rate > 0 else 0
+            pending.clear()
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            chunks = (symbols[j:j + DOWNLOAD_CHUNK_SIZE] for j in range(0, total, DOWNLOAD_CHUNK_SIZE))
+            fetched = fetch_chunks_in_order(executor, chunks, 2 * max_workers)
+            ordered = (
+                (symbol, frames.get(symbol), errors.get(symbol))
+                for chunk, (frames, errors) in fetched
+                for symbol in chunk
+            )
+            for i, (symbol, df, fetch_error) in enumerate(ordered, 1):
+                # Store data
+                if fetch_error is not None:
+                    success, records, error = False, 0, fetch_error
+                elif df is None:
+                    success, records, error = False, 0, "No data available"
+                    cursor.execute(INGEST_ERROR_UPSERT_SQL, (symbol, error, NO_DATA_RETRY_DAYS))
+                else:
+                    success, records, error = store_stock_data_safe(symbol, conn, df=df, cursor=cursor)
                 
-                progress_msg = f"""
+                # Update stats
+                if success:
+                    stats['success'] += 1
+                    stats['total_records'] += records
+                    pending.append((symbol, records))
+                    log.write(f"[{i}/{total}] {symbol}: ✓ {records} records\n")
+                else:
+                    stats['failed'] += 1
+                    stats['failed_symbols'].append((symbol, error))
+                    message = f"[{i}/{total}] {symbol}: ✗ {error}"
+                    print(f"\n{message}")
+                    log.write(f"{message}\n")
+                
+                if len(pending) >= COMMIT_EVERY_TICKERS:
+                    commit_pending()
+                
+                # Successes only go to the log; the console gets one rewritten status line
+                if i % STATUS_EVERY_TICKERS == 0 or i == total:
+                    print(f"\r[{i}/{total}] ✓ {stats['success']} ✗ {stats['failed']} "
+                          f"({stats['total_records']:,} records)", end='', flush=True)
+                
+                # Progress report every 100 stocks
+                if i % 100 == 0:
+                    elapsed = (datetime.now() - start_time).total_seconds()
+                    rate = i / elapsed if elapsed > 0 else 0
+                    remaining_time = (total - i) / rate / 60 if rate > 0 else 0
+                    
+                    progress_msg = f"""
+
 {'='*70}
 PROGRESS UPDATE: {i}/{total} ({i/total*100:.1f}%)
 Elapsed: {elapsed/60:.1f} minutes
@@ -251,12 +606,15 @@ Rate: {rate:.2f} stocks/sec
 Estimated remaining: {remaining_time:.1f} minutes
 {'='*70}
 """
-                print(progress_msg)
-                log.write(progress_msg + "\n")
-                log.flush()  # Force write to disk
-            
-            # Rate limiting - be nice to Yahoo Finance
-            time.sleep(1)  # 1 second between requests
+                    print(progress_msg)
+                    log.write(progress_msg + "\n")
+                    log.flush()  # Force write to disk
+        finally:
+            # Stop fetching if the writer loop exits early (e.g. KeyboardInterrupt),
+            # and keep whatever was already written
+            executor.shutdown(wait=False, cancel_futures=True)
+            commit_pending()
+            cursor.close()
         
         # Final summary
         end_time = datetime.now()
@@ -299,6 +657,7 @@ Average rate: {total/elapsed:.2f} stocks/second
 
 # Test with a single stock
 if __name__ == "__main__":
+    conn = get_db_connection()
     try:
         # Test with single stock
         # store_stock_data("AAPL")
@@ -1,5 +1,6 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 from typing import List
 from dotenv import load_dotenv
@@ -7,10 +8,18 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Bot credentials, read once at import (after load_dotenv)
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID')
+
+# One keep-alive session so repeated notifications reuse the TLS connection
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
 def send_telegram_message(message: str, parse_mode: str = 'HTML') -> bool:
     """Send a message via Telegram bot"""
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    chat_id = os.environ.get('TELEGRAM_CHAT_ID')
+    bot_token = TELEGRAM_BOT_TOKEN
+    chat_id = TELEGRAM_CHAT_ID
     
     if not bot_token or not chat_id:
         return False
@@ -24,7 +33,7 @@ def send_telegram_message(message: str, parse_mode: str = 'HTML') -> bool:
     }
     
     try:
-        response = requests.post(url, json=payload, timeout=10)
+        response = _session.post(url, json=payload, timeout=10)
         result = response.json()
         
         if not result.get('ok', False):
@@ -40,22 +49,22 @@ def format_job_status(results: List[dict], overall_success: bool, duration: floa
     emoji = "✅" if overall_success else "❌"
     status = "SUCCESS" if overall_success else "FAILED"
     
-    message = f"{emoji} <b>Trading Assistant Daily Job - {status}</b>\n\n"
+    parts = [f"{emoji} <b>Trading Assistant Daily Job - {status}</b>\n\n"]
     
     for result in results:
         script_emoji = "✅" if result['success'] else "❌"
-        message += f"{script_emoji} <b>{result['script']}</b>\n"
-        message += f"   Duration: {result['duration_seconds']:.1f}s\n"
+        parts.append(f"{script_emoji} <b>{result['script']}</b>\n")
+        parts.append(f"   Duration: {result['duration_seconds']:.1f}s\n")
         
         if not result['success']:
-            message += f"   Exit Code: {result['exit_code']}\n"
+            parts.append(f"   Exit Code: {result['exit_code']}\n")
             if result.get('error'):
-                message += f"   Error: {result['error']}\n"
+                parts.append(f"   Error: {result['error']}\n")
     
-    message += f"\n<b>Total Duration:</b> {duration:.1f}s\n"
-    message += f"<b>Time:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    parts.append(f"\n<b>Total Duration:</b> {duration:.1f}s\n")
+    parts.append(f"<b>Time:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
-    return message
+    return "".join(parts)
 
 if __name__ == "__main__":
     send_telegram_message("Test message from trading assistant")
\ No newline at end of file
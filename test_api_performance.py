@@ -3,8 +3,9 @@ FastAPI Performance Testing Script
 Tests all endpoints and measures response times
 """
 import requests
+from requests.adapters import HTTPAdapter
 import time
-import statistics
+import numpy as np
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Tuple
@@ -12,10 +13,19 @@ import json
 
 BASE_URL = "http://localhost:8000/api/v1"
 
+# Pooled keep-alive connections per host; covers the largest concurrent test
+HTTP_POOL_SIZE = 32
+
 class PerformanceTest:
     def __init__(self, base_url: str = BASE_URL):
         self.base_url = base_url
         self.results: List[Dict] = []
+        
+        # One session for every request so connections (and TLS) are reused
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
     def test_endpoint(
         self, 
@@ -23,19 +33,25 @@ class PerformanceTest:
         method: str, 
         endpoint: str, 
         params: dict = None,
-        expected_status: int = 200
+        expected_status: int = 200,
+        return_json: bool = False
     ) -> Dict:
-        """Test a single endpoint and measure performance"""
+        """Test a single endpoint and measure performance
+        
+        With return_json=True the parsed body of a successful response is put on
+        the result under 'json' (parsed after timing); callers should pop it so
+        it isn't saved with the results.
+        """
         url = f"{self.base_url}{endpoint}"
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             if method.upper() == "GET":
-                response = requests.get(url, params=params, timeout=60)
+                response = self.session.get(url, params=params, timeout=60)
             else:
-                response = requests.request(method, url, json=params, timeout=60)
+                response = self.session.request(method, url, json=params, timeout=60)
             
-            elapsed = time.time() - start_time
+            elapsed = time.perf_counter() - start_time
             
             result = {
                 "name": name,
@@ -48,6 +64,12 @@ class PerformanceTest:
                 "error": None
             }
             
+            if return_json and result["success"]:
+                try:
+                    result["json"] = response.json()
+                except ValueError:
+                    pass
+            
             if response.status_code != expected_status:
                 result["error"] = f"Expected {expected_status}, got {response.status_code}"
                 try:
@@ -56,7 +78,7 @@ class PerformanceTest:
                     result["error_detail"] = response.text[:200]
             
         except requests.exceptions.Timeout:
-            elapsed = time.time() - start_time
+            elapsed = time.perf_counter() - start_time
             result = {
                 "name": name,
                 "endpoint": endpoint,
@@ -68,7 +90,7 @@ class PerformanceTest:
                 "error": "Request timeout (>60s)"
             }
         except Exception as e:
-            elapsed = time.time() - start_time
+            elapsed = time.perf_counter() - start_time
             result = {
                 "name": name,
                 "endpoint": endpoint,
@@ -140,20 +162,13 @@ class PerformanceTest:
                 "interval": interval,
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat()
-            }
+            },
+            return_json=True
         )
         
         if result['success']:
             try:
-                data = requests.get(
-                    f"{self.base_url}/symbols/{symbol}/prices",
-                    params={
-                        "interval": interval,
-                        "start_date": start_date.isoformat(),
-                        "end_date": end_date.isoformat()
-                    },
-                    timeout=60
-                ).json()
+                data = result.pop('json')
                 result['data_points'] = data.get('count', 0)
                 print(f"  ✓ {result['response_time']:.3f}s - Status: {result['status_code']} - {result['data_points']} data points")
             except:
@@ -184,35 +199,35 @@ class PerformanceTest:
         print(f"Testing {num_requests} concurrent requests to {endpoint}...")
         
         def make_request():
-            start = time.time()
+            start = time.perf_counter()
             try:
-                response = requests.get(
+                response = self.session.get(
                     f"{self.base_url}{endpoint}",
                     params=params,
                     timeout=60
                 )
-                elapsed = time.time() - start
+                elapsed = time.perf_counter() - start
                 return {
                     "success": response.status_code == 200,
                     "response_time": elapsed,
                     "status_code": response.status_code
                 }
             except Exception as e:
-                elapsed = time.time() - start
+                elapsed = time.perf_counter() - start
                 return {
                     "success": False,
                     "response_time": elapsed,
                     "error": str(e)
                 }
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         with ThreadPoolExecutor(max_workers=num_requests) as executor:
             futures = [executor.submit(make_request) for _ in range(num_requests)]
             results = [f.result() for f in as_completed(futures)]
         
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
         success_count = sum(1 for r in results if r.get('success', False))
-        response_times = [r['response_time'] for r in results]
+        response_times = np.fromiter((r['response_time'] for r in results), dtype=np.float64, count=len(results))
         
         result = {
             "name": f"Concurrent Requests ({num_requests})",
@@ -220,10 +235,11 @@ class PerformanceTest:
             "total_time": total_time,
             "success_count": success_count,
             "failure_count": num_requests - success_count,
-            "avg_response_time": statistics.mean(response_times) if response_times else 0,
-            "min_response_time": min(response_times) if response_times else 0,
-            "max_response_time": max(response_times) if response_times else 0,
-            "median_response_time": statistics.median(response_times) if response_times else 0,
+            "avg_response_time": float(response_times.mean()) if response_times.size else 0,
+            "min_response_time": float(response_times.min()) if response_times.size else 0,
+            "max_response_time": float(response_times.max()) if response_times.size else 0,
+            "median_response_time": float(np.median(response_times)) if response_times.size else 0,
+            "p95_response_time": float(np.percentile(response_times, 95)) if response_times.size else 0,
         }
         
         print(f"  ✓ Total: {total_time:.3f}s - Success: {success_count}/{num_requests}")
@@ -329,18 +345,21 @@ class PerformanceTest:
             return
         
         # Overall statistics
-        response_times = [r['response_time'] for r in successful]
+        response_times = np.fromiter((r['response_time'] for r in successful), dtype=np.float64, count=len(successful))
+        p50, p95, p99 = np.percentile(response_times, [50, 95, 99])
         print(f"Total Tests: {len(self.results)}")
         print(f"Successful: {len(successful)}")
         print(f"Failed: {len(self.results) - len(successful)}")
         print()
         
         print("Response Time Statistics:")
-        print(f"  Average: {statistics.mean(response_times):.3f}s")
-        print(f"  Median:  {statistics.median(response_times):.3f}s")
-        print(f"  Min:     {min(response_times):.3f}s")
-        print(f"  Max:     {max(response_times):.3f}s")
-        print(f"  Std Dev: {statistics.stdev(response_times):.3f}s" if len(response_times) > 1 else "  Std Dev: N/A")
+        print(f"  Average: {response_times.mean():.3f}s")
+        print(f"  Median:  {p50:.3f}s")
+        print(f"  P95:     {p95:.3f}s")
+        print(f"  P99:     {p99:.3f}s")
+        print(f"  Min:     {response_times.min():.3f}s")
+        print(f"  Max:     {response_times.max():.3f}s")
+        print(f"  Std Dev: {response_times.std(ddof=1):.3f}s" if len(response_times) > 1 else "  Std Dev: N/A")
         print()
         
         # Slowest endpoints
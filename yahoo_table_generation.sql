@@ -20,8 +20,13 @@ CREATE TABLE yahoo_adjusted_stock_prices (
 SELECT create_hypertable('yahoo_adjusted_stock_prices', 'timestamp');
 
 -- Add indexes for performance
+-- close is carried in the index so "latest close per symbol before a date" lookups
+-- (relative strength anchors) are index-only scans. On an existing database:
+--   DROP INDEX idx_stock_prices_symbol_time; then run the CREATE INDEX below
+--   (TimescaleDB does not support CONCURRENTLY; use
+--   WITH (timescaledb.transaction_per_chunk) to avoid one long lock)
 CREATE INDEX idx_stock_prices_symbol_time 
-ON yahoo_adjusted_stock_prices (symbol, timestamp DESC);
+ON yahoo_adjusted_stock_prices (symbol, timestamp DESC) INCLUDE (close);
 
 CREATE INDEX idx_timestamp 
 ON yahoo_adjusted_stock_prices (timestamp DESC);
@@ -69,4 +74,31 @@ ADD COLUMN IF NOT EXISTS pct_change_1d DECIMAL(10, 2),
 ADD COLUMN IF NOT EXISTS adr20 DECIMAL(6, 2),
 ADD COLUMN IF NOT EXISTS low_52w DECIMAL(16, 4),
 ADD COLUMN IF NOT EXISTS current_volume BIGINT,
-ADD COLUMN IF NOT EXISTS avg_volume_30d BIGINT;
\ No newline at end of file
+ADD COLUMN IF NOT EXISTS avg_volume_30d BIGINT;
+-- CREATE stock_ingest_errors TABLE
+---------------------------------------
+-- Symbols Yahoo returned no data for during bulk load; skipped until retry_after
+-- (also created on demand by store_stock_data.bulk_load_stocks)
+CREATE TABLE IF NOT EXISTS stock_ingest_errors (
+    symbol TEXT PRIMARY KEY,
+    last_error TEXT,
+    retry_after TIMESTAMPTZ NOT NULL
+);
+
+-- CREATE stock_ingest_state TABLE
+---------------------------------------
+-- Symbols with prices loaded, recorded after every bulk/single load
+-- (store_stock_data.ensure_ingest_state_table creates and seeds it before a load
+-- if this migration hasn't been run)
+CREATE TABLE IF NOT EXISTS stock_ingest_state (
+    symbol TEXT PRIMARY KEY
+);
+
+-- Tables created before last_ts was dropped (nothing read it, and the daily update never kept it current)
+ALTER TABLE stock_ingest_state DROP COLUMN IF EXISTS last_ts;
+
+-- One-time migration: seed with every symbol already in the price table
+INSERT INTO stock_ingest_state (symbol)
+SELECT DISTINCT symbol
+FROM yahoo_adjusted_stock_prices
+ON CONFLICT (symbol) DO NOTHING;